@@ -0,0 +1,16 @@
+"""Import time benchmarks (run with asv).
+
+Each timeraw_ benchmark runs in a fresh interpreter, so the import is measured cold.
+"""
+
+
+def timeraw_import_revonto_reverse_lookup():
+    return "import revonto.reverse_lookup"
+
+
+def timeraw_import_revonto_associations():
+    return "import revonto.associations"
+
+
+def timeraw_import_revonto_ontology():
+    return "import revonto.ontology"
@@ -0,0 +1,49 @@
+"""Benchmarks for reading OBO and GAF files (run with asv).
+
+The files come from benchmarks/generators.py, sized by REVONTO_BENCH_SCALE. Peak memory is
+tracked with revonto.memory.track_peaks around the measured call only (asv peakmem_* would report
+the max RSS of the whole benchmark process).
+"""
+
+from revonto.associations import Annotations, GafParser
+from revonto.memory import track_peaks
+from revonto.ontology import GODag, OBOReader
+
+from .generators import dataset, scale
+
+
+class Parsing:
+    """OBOReader/GODag.from_file and GafParser/Annotations.from_file."""
+
+    timeout = 3600
+
+    def setup(self):
+        self.obo, self.gaf = dataset(**scale())
+
+    def time_obo_reader(self):
+        for _ in OBOReader(self.obo):
+            pass
+
+    def time_godag_from_file(self):
+        GODag.from_file(self.obo)
+
+    def track_peak_godag_from_file(self):
+        with track_peaks() as tracker:
+            GODag.from_file(self.obo)
+        return tracker.peak
+
+    track_peak_godag_from_file.unit = "bytes"
+
+    def time_gaf_parser(self):
+        for _ in GafParser(self.gaf):
+            pass
+
+    def time_annotations_from_file(self):
+        Annotations.from_file(self.gaf)
+
+    def track_peak_annotations_from_file(self):
+        with track_peaks() as tracker:
+            Annotations.from_file(self.gaf)
+        return tracker.peak
+
+    track_peak_annotations_from_file.unit = "bytes"
@@ -0,0 +1,47 @@
+"""Benchmarks for calculating uncorrected p-values (run with asv)."""
+
+import numpy as np
+
+from revonto.pvalcalc import (
+    LogFactorialTable,
+    pvalue_calculate,
+    pvalue_calculate_batch,
+)
+
+
+class PvalueCalculation:
+    """Compare pvalcalc methods on a reverse lookup sized problem."""
+
+    params = (["fisher_scipy_stats", "fisher_logfactorial"], [1000, 50000])
+    param_names = ["method", "pop_n"]
+
+    def setup(self, method, pop_n):
+        rng = np.random.default_rng(0)
+        self.study_n = 200
+        self.pop_count = rng.integers(1, pop_n // 10, size=20000)
+        self.study_count = np.minimum(rng.integers(1, 20, size=20000), self.pop_count)
+        self.table = LogFactorialTable(pop_n)
+
+    def time_scalar(self, method, pop_n):
+        for sc, pc in zip(self.study_count[:500], self.pop_count[:500]):
+            pvalue_calculate(int(sc), self.study_n, int(pc), pop_n, method)
+
+    def time_batch(self, method, pop_n):
+        pvalue_calculate_batch(
+            self.study_count,
+            self.study_n,
+            self.pop_count,
+            pop_n,
+            method,
+            table=self.table,
+        )
+
+
+class LogFactorialTableBuild:
+    """Cost of building the table once per study."""
+
+    params = [1000, 50000]
+    param_names = ["pop_n"]
+
+    def time_build(self, pop_n):
+        LogFactorialTable(pop_n)
@@ -0,0 +1,80 @@
+"""Benchmarks for propagation and reverse lookup studies (run with asv).
+
+The ontology, annotations and studysets come from benchmarks/generators.py, sized by
+REVONTO_BENCH_SCALE. Reading the files is part of setup, not of the measured time. Peak memory is
+tracked with revonto.memory.track_peaks around the measured call only (asv peakmem_* would include
+the annotations loaded in setup).
+"""
+
+from revonto.associations import Annotations
+from revonto.memory import track_peaks
+from revonto.ontology import GODag
+from revonto.pvalcalc import PvalueCache
+from revonto.reverse_lookup import GOReverseLookupStudy, results_intersection
+
+from .generators import dataset, scale, studysets
+
+
+class Propagation:
+    """Annotations.propagate_associations (modifies the annotations, so setup runs every time)."""
+
+    timeout = 3600
+    number = 1
+    repeat = 3
+
+    def setup(self):
+        obo, gaf = dataset(**scale())
+        self.godag = GODag.from_file(obo)
+        self.anno = Annotations.from_file(gaf)
+
+    def time_propagate_associations(self):
+        self.anno.propagate_associations(self.godag)
+
+    def track_peak_propagate_associations(self):
+        with track_peaks() as tracker:
+            self.anno.propagate_associations(self.godag)
+        return tracker.peak
+
+    track_peak_propagate_associations.unit = "bytes"
+
+
+class Study:
+    """run_study, run_studies and set operations on the results."""
+
+    timeout = 3600
+
+    def setup(self):
+        sizes = scale()
+        obo, gaf = dataset(**sizes)
+        godag = GODag.from_file(obo)
+        # no p-value memo: setup and repeats would otherwise leave the measured calls only hits
+        self.study = GOReverseLookupStudy(
+            Annotations.from_file(gaf),
+            godag,
+            methods=["bonferroni", "fdr_bh"],
+            pval_cache=PvalueCache(maxsize=0),
+        )
+        self.study.index  # built once per study, not part of the measured time
+        self.studysets = studysets(
+            sizes["n_studysets"], sizes["studyset_size"], sizes["n_terms"]
+        )
+        self.results = [self.study.run_study(s) for s in self.studysets[:10]]
+
+    def time_run_study(self):
+        self.study.run_study(self.studysets[0])
+
+    def time_run_study_table(self):
+        self.study.run_study(self.studysets[0], as_table=True)
+
+    def time_run_studies(self):
+        self.study.run_studies(self.studysets)
+
+    def track_peak_run_studies(self):
+        with track_peaks() as tracker:
+            self.study.run_studies(self.studysets)
+        return tracker.peak
+
+    track_peak_run_studies.unit = "bytes"
+
+    def time_results_intersection(self):
+        results_intersection(*self.results)
@@ -0,0 +1,139 @@
+"""Deterministic synthetic ontologies, annotation files and studysets for the benchmarks.
+
+The same arguments always give the same files, so timings can be compared across commits. Files
+are written once to REVONTO_BENCH_DIR (default: <tmp>/revonto-bench) and reused by later runs.
+
+The size of the benchmark data is chosen with REVONTO_BENCH_SCALE: "small" (default, seconds per
+benchmark) or "production" (50k term DAG, 10M line GAF and 1000 studysets).
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+GENERATOR_VERSION = 1  # bump when the generated content changes
+
+SCALES = {
+    "small": {
+        "n_terms": 2_000,
+        "n_products": 2_000,
+        "n_lines": 20_000,
+        "n_studysets": 100,
+        "studyset_size": 50,
+    },
+    "production": {
+        "n_terms": 50_000,
+        "n_products": 20_000,
+        "n_lines": 10_000_000,
+        "n_studysets": 1_000,
+        "studyset_size": 200,
+    },
+}
+
+NAMESPACES = ["biological_process", "molecular_function", "cellular_component"]
+
+
+def scale() -> dict:
+    """Sizes of the selected REVONTO_BENCH_SCALE."""
+    return SCALES[os.environ.get("REVONTO_BENCH_SCALE", "small")]
+
+
+def data_dir() -> str:
+    path = os.environ.get(
+        "REVONTO_BENCH_DIR", os.path.join(tempfile.gettempdir(), "revonto-bench")
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def term_id(i: int) -> str:
+    return f"GO:{i:07}"
+
+
+def write_obo(path: str, n_terms: int, max_parents: int = 3, seed: int = 0) -> None:
+    """OBO file of a DAG with one root per namespace.
+
+    Every other term has 1 to max_parents parents among the terms before it (so the graph is
+    acyclic, with a depth growing like log(n_terms) as in GO) and the namespace of its first parent.
+    """
+    rng = np.random.default_rng(seed)
+    namespace = list(NAMESPACES)  # namespace of each term
+    with open(path, "w") as f:
+        f.write("format-version: 1.2\ndata-version: synthetic\n\n")
+        for i in range(n_terms):
+            lines = ["[Term]", f"id: {term_id(i)}", f"name: term {i}"]
+            if i < len(NAMESPACES):
+                lines.append(f"namespace: {namespace[i]}")
+            else:
+                first = int(rng.integers(0, i))
+                others = rng.integers(0, i, size=rng.integers(0, max_parents))
+                parents = dict.fromkeys([first] + others.tolist())
+                namespace.append(namespace[first])
+                lines.append(f"namespace: {namespace[i]}")
+                lines.extend(
+                    f"is_a: {term_id(parent)} ! term {parent}" for parent in parents
+                )
+            f.write("\n".join(lines) + "\n\n")
+
+
+def write_gaf(
+    path: str,
+    n_lines: int,
+    n_products: int,
+    n_terms: int,
+    seed: int = 0,
+    chunk_size: int = 100_000,
+) -> None:
+    """GAF 2.2 file of n_lines annotations of n_products products to n_terms terms.
+
+    Products and terms are drawn with a heavy tail (few products and terms with many annotations),
+    lines are written in chunks so memory does not grow with n_lines.
+    """
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write("!gaf-version: 2.2\n!date-generated: 2024-01-01T00:00\n")
+        for start in range(0, n_lines, chunk_size):
+            size = min(chunk_size, n_lines - start)
+            products = (rng.zipf(1.3, size) - 1) % n_products
+            terms = rng.integers(len(NAMESPACES), n_terms, size)
+            f.writelines(
+                f"UniProtKB\tP{p:06}\tGENE{p}\tinvolved_in\t{term_id(t)}\t"
+                f"GO_REF:0000043\tIEA\t\tP\tprotein {p}\t\tprotein\ttaxon:9606\t20240101\tUniProt\n"
+                for p, t in zip(products.tolist(), terms.tolist())
+            )
+
+
+def studysets(
+    n_studysets: int, size: int, n_terms: int, seed: int = 0
+) -> list[list[str]]:
+    """Random studysets of distinct terms (roots excluded)."""
+    rng = np.random.default_rng(seed)
+    return [
+        [
+            term_id(int(t))
+            for t in rng.choice(
+                np.arange(len(NAMESPACES), n_terms), size=size, replace=False
+            )
+        ]
+        for _ in range(n_studysets)
+    ]
+
+
+def dataset(n_terms: int, n_products: int, n_lines: int, **_) -> tuple[str, str]:
+    """Paths of the OBO and GAF files of the given size (generated on first use)."""
+    directory = data_dir()
+    obo = os.path.join(directory, f"v{GENERATOR_VERSION}_{n_terms}.obo")
+    gaf = os.path.join(
+        directory, f"v{GENERATOR_VERSION}_{n_terms}_{n_products}_{n_lines}.gaf"
+    )
+    for path, write in [
+        (obo, lambda tmp: write_obo(tmp, n_terms)),
+        (gaf, lambda tmp: write_gaf(tmp, n_lines, n_products, n_terms)),
+    ]:
+        if not os.path.exists(path):
+            # parallel benchmark processes never see half written files
+            tmp = f"{path}.{os.getpid()}.tmp"
+            write(tmp)
+            os.replace(tmp, path)
+    return obo, gaf
@@ -6,13 +6,28 @@ from __future__ import annotations as an
 from typing import TYPE_CHECKING, Any, Generator, Iterable, Optional
 
 if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+
     from .ontology import GODag
 
+import asyncio
 import copy
 import os
 
 from .geneinfo import convert_ids as _convert_ids
+from .geneinfo import convert_ids_async as _convert_ids_async
 from .ortholog import find_orthologs as _find_orthologs
+from .ortholog import find_orthologs_async as _find_orthologs_async
+from .timing import timed
+
+
+def _count_annotations(annotations, *args, **kwargs) -> dict[str, int]:
+    return {"annotations": len(annotations)}
+
+
+def _count_self(result, self, *args, **kwargs) -> dict[str, int]:
+    """annotations after a method changed them"""
+    return {"annotations": len(self)}
 
 
 class Annotation:
@@ -25,6 +40,7 @@ class Annotation:
     evidence_code (object)
     taxon
     date
+    provenance (steps which derived this annotation from another, e.g. "ortholog")
     """
 
     def __init__(
@@ -37,6 +53,7 @@ class Annotation:
         evidence_code=None,
         taxon=None,
         date=None,
+        provenance: tuple[str, ...] = (),
         **kwargs,
     ) -> None:
         # mandatory - this makes an annotation "unique", rest is just metadata
@@ -51,11 +68,23 @@ class Annotation:
         self.reference = reference
         self.evidence_code = evidence_code
         self.date = date
+        self.provenance = provenance  # e.g. ("convert_ids", "ortholog") if derived
         # you can add any number of others TODO: Maybe optional object class like goatools
 
     def copy(self) -> Annotation:
         return copy.deepcopy(self)
 
+    def replace(self, **changes) -> Annotation:
+        """Return a shallow copy with some attributes replaced.
+
+        All attributes are immutable, so this is a much cheaper alternative to copy()
+        when deriving new annotations in bulk.
+        """
+        new_anno = self.__class__.__new__(self.__class__)
+        new_anno.__dict__.update(self.__dict__)
+        new_anno.__dict__.update(changes)
+        return new_anno
+
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Annotation):
             return NotImplemented
@@ -77,8 +106,12 @@ class Annotations(set[Annotation]):
 
     def __init__(self, annotations: Optional[Iterable[Annotation]] = None):
         super().__init__(annotations) if annotations is not None else super().__init__()
+        # incremented on every change, so indexes built from Annotations know when to rebuild.
+        # Changing attributes of Annotation objects in the set directly is not tracked.
+        self._version = 0
 
     @classmethod
+    @timed("Annotations.from_file", _count_annotations)
     def from_file(cls, file):
         """read association file"""
 
@@ -154,6 +187,34 @@ class Annotations(set[Annotation]):
 
         return grouped_dict
 
+    def incidence_matrix(self) -> tuple[csr_matrix, list[str], list[str]]:
+        """Sparse (products x terms) incidence matrix.
+
+        The same (object_id, term_id) with different taxons counts once.
+
+        Returns:
+            tuple[csr_matrix, list[str], list[str]]: 0/1 matrix, object_ids (rows) and term_ids (columns)
+        """
+        import numpy as np
+        from scipy.sparse import csr_matrix
+
+        object_index: dict[str, int] = {}
+        term_index: dict[str, int] = {}
+        rows = []
+        cols = []
+        for annoobj in self:
+            rows.append(object_index.setdefault(annoobj.object_id, len(object_index)))
+            cols.append(term_index.setdefault(annoobj.term_id, len(term_index)))
+        matrix = csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(object_index), len(term_index)),
+        )
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+
+        return matrix, list(object_index), list(term_index)
+
+    @timed("propagate_associations", _count_self)
     def propagate_associations(self, godag: GODag) -> None:
         """
         Iterate through the ontology and assign all childrens' annotations to each term.
@@ -197,42 +258,71 @@ class Annotations(set[Annotation]):
         for annoobj in self:
             if annoobj.taxon:
                 annoobj.object_id = annoobj.object_id + "-" + annoobj.taxon
+        self._version += 1
 
+    @timed("find_orthologs", _count_self)
     def find_orthologs(self, taxon: str, database="gOrth", prune=False) -> None:
-        """_summary_
+        """Add annotations for orthologs of all products in target taxon.
+
+        Annotations are joined to the ortholog mapping table of their taxon and all new rows are
+        added in a single pass. New annotations record "ortholog" in their provenance.
 
         Args:
-            taxon (_type_): _description_
-            prune (bool, optional): _description_. Defaults to False.
+            taxon (str): NCBI taxon id of the target species
+            database (str, optional): source of ortholog information. Defaults to "gOrth".
+            prune (bool, optional): remove the original (source taxon) annotations. Defaults to False.
         """
         if not isinstance(taxon, str):
             raise TypeError("taxon must be str")
         # TODO: handle genename-taxon
-        anno_by_taxon = self.dict_from_attr("taxon")
-        for (
-            src_taxon,
-            annos,
-        ) in anno_by_taxon.items():  # perhaps there are multiple taxons in Annotations
-            object_ids = set(a.object_id.split(":", 1)[1] for a in annos)
-            orthologs_dict = _find_orthologs(
-                list(object_ids), src_taxon, taxon, database
+        by_taxon = self._unprefixed_by_taxon()
+        orthologs = {
+            src_taxon: _find_orthologs(
+                list(set(unprefixed_ids.values())), src_taxon, taxon, database
+            )
+            for src_taxon, unprefixed_ids in by_taxon.items()
+        }
+        self._add_orthologs(taxon, by_taxon, orthologs, prune)
+
+    @timed("find_orthologs", _count_self)
+    async def find_orthologs_async(
+        self, taxon: str, database="gOrth", prune=False
+    ) -> None:
+        """Awaitable find_orthologs, the requests of all taxons are sent concurrently."""
+        if not isinstance(taxon, str):
+            raise TypeError("taxon must be str")
+        by_taxon = self._unprefixed_by_taxon()
+        mappings = await asyncio.gather(
+            *(
+                _find_orthologs_async(
+                    list(set(unprefixed_ids.values())), src_taxon, taxon, database
+                )
+                for src_taxon, unprefixed_ids in by_taxon.items()
             )
-            for (
-                anno
-            ) in (
-                annos
-            ):  # for each annotation create new ortholog objects, then delete the original
-                obj_id_without_prexix = anno.object_id.split(":", 1)[1]
-                for ortlg in orthologs_dict.get(
-                    obj_id_without_prexix, []
-                ):  # there could be more tha one ortholog
-                    new_anno = anno.copy()
-                    new_anno.object_id = ortlg
-                    new_anno.taxon = taxon
-                    # new_anno.evidence_code = "something" # in future change evidence code to record it was obtained by ortholog search
-                    self.add(new_anno)
-                if prune is True:
-                    self.remove(anno)  # TODO: should this only be done if prune?
+        )
+        self._add_orthologs(taxon, by_taxon, dict(zip(by_taxon, mappings)), prune)
+
+    def _add_orthologs(
+        self,
+        taxon: str,
+        by_taxon: dict[str, dict[Annotation, str]],
+        orthologs: dict[str, dict[str, list[str]]],
+        prune: bool,
+    ) -> None:
+        """join annotations to the ortholog mapping of their taxon"""
+        new_annos = [
+            anno.replace(
+                object_id=ortlg,
+                taxon=taxon,
+                provenance=anno.provenance + ("ortholog",),
+            )
+            for src_taxon, unprefixed_ids in by_taxon.items()
+            for anno, obj_id in unprefixed_ids.items()
+            for ortlg in orthologs[src_taxon].get(obj_id, [])  # could be more than one
+        ]
+        if prune is True:
+            self.clear()  # every annotation was an original one
+        self.update(new_annos)
 
     def filter(self, keep_if):
         """_summary_
@@ -243,24 +333,110 @@ class Annotations(set[Annotation]):
         items_to_delete = [anno for anno in self if not keep_if(anno)]
         self.difference_update(items_to_delete)
 
+    @timed("convert_ids", _count_self)
     def convert_ids(self, namespace: str = "ensg", database: str = "gConvert"):
-        anno_by_taxon = self.dict_from_attr("taxon")
+        """Convert object_ids to another namespace.
+
+        Annotations are joined to the conversion table of their taxon. Annotations with at least one
+        converted id are replaced by the converted ones (recording "convert_ids" in their provenance),
+        the rest are left as they are.
+
+        Args:
+            namespace (str, optional): target namespace. Defaults to "ensg".
+            database (str, optional): source of conversion. Defaults to "gConvert".
+        """
         # TODO: handle genename-taxon
-        for (
-            taxon,
-            annos,
-        ) in anno_by_taxon.items():  # perhaps there are multiple taxons in Annotations
-            object_ids = set(a.object_id.split(":", 1)[1] for a in annos)
-            converted_dict = _convert_ids(list(object_ids), taxon, namespace, database)
-            for anno in annos:
-                obj_id_without_prexix = anno.object_id.split(":", 1)[1]
-                for conv_id in converted_dict.get(obj_id_without_prexix, []):
-                    new_anno = anno.copy()
-                    new_anno.object_id = conv_id
-                    # new_anno.evidence_code = "something" # in future change evidence code to record it was obtained by ortholog search
-                    self.add(new_anno)
-                if converted_dict.get(obj_id_without_prexix):
-                    self.remove(anno)
+        by_taxon = self._unprefixed_by_taxon()
+        conversions = {
+            taxon: _convert_ids(
+                list(set(unprefixed_ids.values())), taxon, namespace, database
+            )
+            for taxon, unprefixed_ids in by_taxon.items()
+        }
+        self._apply_conversions(by_taxon, conversions)
+
+    @timed("convert_ids", _count_self)
+    async def convert_ids_async(
+        self, namespace: str = "ensg", database: str = "gConvert"
+    ) -> None:
+        """Awaitable convert_ids, the requests of all taxons are sent concurrently."""
+        by_taxon = self._unprefixed_by_taxon()
+        mappings = await asyncio.gather(
+            *(
+                _convert_ids_async(
+                    list(set(unprefixed_ids.values())), taxon, namespace, database
+                )
+                for taxon, unprefixed_ids in by_taxon.items()
+            )
+        )
+        self._apply_conversions(by_taxon, dict(zip(by_taxon, mappings)))
+
+    def _apply_conversions(
+        self,
+        by_taxon: dict[str, dict[Annotation, str]],
+        conversions: dict[str, dict[str, list[str]]],
+    ) -> None:
+        """join annotations to the conversion table of their taxon"""
+        new_annos = []
+        converted_annos = []
+        for taxon, unprefixed_ids in by_taxon.items():
+            converted_dict = conversions[taxon]
+            for anno, obj_id in unprefixed_ids.items():
+                conv_ids = converted_dict.get(obj_id)
+                if conv_ids:
+                    converted_annos.append(anno)
+                    provenance = anno.provenance + ("convert_ids",)
+                    new_annos.extend(
+                        anno.replace(object_id=conv_id, provenance=provenance)
+                        for conv_id in conv_ids
+                    )
+        self.difference_update(converted_annos)
+        self.update(new_annos)
+
+    def _unprefixed_by_taxon(self) -> dict[str, dict[Annotation, str]]:
+        """unprefixed object_ids of the annotations of each taxon
+        (perhaps there are multiple taxons in Annotations)"""
+        return {
+            taxon: self._unprefixed_object_ids(annos)
+            for taxon, annos in self.dict_from_attr("taxon").items()
+        }
+
+    @staticmethod
+    def _unprefixed_object_ids(annos: Iterable[Annotation]) -> dict[Annotation, str]:
+        """map annotations to their object_id without the DB prefix (split only once per annotation)"""
+        return {anno: anno.object_id.split(":", 1)[1] for anno in annos}
+
+
+def _tracked(name: str):
+    """wrap set method, which changes the set, to increment Annotations._version"""
+    set_method = getattr(set, name)
+
+    def method(self, *args):
+        result = set_method(self, *args)
+        self._version += 1
+        return result
+
+    method.__name__ = name
+    method.__doc__ = set_method.__doc__
+    return method
+
+
+for _name in (
+    "add",
+    "remove",
+    "discard",
+    "pop",
+    "clear",
+    "update",
+    "difference_update",
+    "intersection_update",
+    "symmetric_difference_update",
+    "__ior__",
+    "__iand__",
+    "__isub__",
+    "__ixor__",
+):
+    setattr(Annotations, _name, _tracked(_name))
 
 
 class AnnoParserBase:
@@ -0,0 +1,76 @@
+"""Packed bitsets of terms: one bit per index column, 64 columns per uint64 word.
+
+The study_count of a product is the size of the intersection of its terms and the studyset. With
+both packed, it is the popcount of their AND, so the counts of all products come from a few
+vectorized NumPy operations over (products x words) arrays, independent of how many terms are set.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+
+WORD_BITS = 64
+
+# popcount of every byte, for numpy < 2.0 which has no np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def n_words(n_bits: int) -> int:
+    return (n_bits + WORD_BITS - 1) // WORD_BITS
+
+
+def pack_rows(matrix: csr_matrix) -> np.ndarray:
+    """Pack each row of a sparse 0/1 matrix into a bitset.
+
+    Returns:
+        np.ndarray: (rows x words) uint64 array, bit j of row i set if matrix[i, j] != 0
+    """
+    coo = matrix.tocoo()
+    packed = np.zeros((matrix.shape[0], n_words(matrix.shape[1])), dtype=np.uint64)
+    cols = coo.col.astype(np.uint64)
+    bits = np.left_shift(np.uint64(1), cols % np.uint64(WORD_BITS))
+    np.bitwise_or.at(
+        packed, (coo.row, (cols // np.uint64(WORD_BITS)).astype(np.intp)), bits
+    )
+    return packed
+
+
+def pack_columns(cols: np.ndarray, n_bits: int) -> np.ndarray:
+    """Bitset of n_bits with the given columns set."""
+    packed = np.zeros(n_words(n_bits), dtype=np.uint64)
+    cols = np.asarray(cols, dtype=np.uint64)
+    bits = np.left_shift(np.uint64(1), cols % np.uint64(WORD_BITS))
+    np.bitwise_or.at(packed, (cols // np.uint64(WORD_BITS)).astype(np.intp), bits)
+    return packed
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Number of set bits of each uint64 word."""
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(words)
+    counts = _BYTE_POPCOUNT[words.view(np.uint8)]
+    return counts.reshape(words.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def intersection_counts(
+    packed_rows: np.ndarray, packed_set: np.ndarray, block_size: int = 4096
+) -> np.ndarray:
+    """Size of the intersection of every row with one set (AND + popcount).
+
+    Rows are processed in blocks of block_size, so temporaries stay small for large arrays.
+
+    Returns:
+        np.ndarray: int64 count for each row
+    """
+    counts = np.empty(len(packed_rows), dtype=np.int64)
+    for start in range(0, len(packed_rows), block_size):
+        block = packed_rows[start : start + block_size]
+        counts[start : start + block_size] = popcount(block & packed_set).sum(
+            axis=1, dtype=np.int64
+        )
+    return counts
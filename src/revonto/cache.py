@@ -0,0 +1,76 @@
+"""Bounded (LRU) in-memory cache shared by PvalueCache and ResultCache."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """Least recently used entries are evicted beyond maxsize; hits and misses are counted.
+
+    Subclasses decide what a hit is (e.g. per requested p-value) and report it with _count.
+    It is safe to share between threads, and can be pickled (the lock is recreated).
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def info(self) -> dict:
+        """hits, misses, hit_rate, currsize and maxsize of the cache"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "currsize": len(self._cache),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self) -> None:
+        """Remove all entries and reset hits and misses."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _get(self, key: Hashable) -> Optional[Any]:
+        """Value of key (marked as recently used), None if missing. Not counted."""
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+            return value
+
+    def _set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
@@ -0,0 +1,217 @@
+"""Empirical (permutation based) p-values for reverse lookup.
+
+GO terms are not independent within the DAG, so the analytic tests in pvalcalc can be anti-conservative.
+Here random studysets of equal size (optionally matched by depth or namespace) are drawn from the
+population of GO terms and per-product counts of all draws are obtained with one sparse matrix product
+per chunk of draws. Chunks are spread across a process pool. Every chunk has its own seed (spawned from
+one SeedSequence), and chunks are consumed in order, so the results do not depend on n_jobs.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+
+    from .ontology import GODag
+
+# (pool of term column indices, number of terms to draw from it)
+Strata = list[tuple[np.ndarray, int]]
+
+_worker_state: dict = {}
+
+
+def build_strata(
+    godag: GODag,
+    studyset: Iterable[str],
+    match: Optional[str] = None,
+    term_ids: Optional[list[str]] = None,
+) -> Strata:
+    """Group population terms (term_ids, in order) so random studysets match the studyset.
+
+    Args:
+        godag (GODag): ontology
+        studyset (Iterable[str]): terms in study
+        match (str, optional): None, "depth" or "namespace". Defaults to None.
+        term_ids (list[str], optional): population terms. Defaults to None (GODag keys).
+
+    Raises:
+        ValueError: if match is unknown or a studyset term is not in godag when matching
+
+    Returns:
+        Strata: list of (term indices to draw from, number of terms to draw)
+    """
+    studyset = set(studyset)
+    if term_ids is None:
+        term_ids = list(godag)
+    if match is None:
+        return [(np.arange(len(term_ids)), len(studyset))]
+    if match not in ("depth", "namespace"):
+        raise ValueError(f"can not match random studysets by {match}")
+    if not studyset.issubset(godag):
+        raise ValueError(
+            "all studyset terms must be in GODag to match random studysets"
+        )
+
+    pools: dict = {}
+    for i, term_id in enumerate(term_ids):
+        pools.setdefault(getattr(godag[term_id], match), []).append(i)
+    draws: dict = {}
+    for term_id in studyset:
+        key = getattr(godag[term_id], match)
+        draws[key] = draws.get(key, 0) + 1
+
+    return [(np.array(pools[key]), n) for key, n in draws.items()]
+
+
+def count_exceedances(
+    matrix: csr_matrix,
+    strata: Strata,
+    seed: np.random.SeedSequence,
+    n_draws: int,
+    rows: np.ndarray,
+    observed: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """For products in rows, count random studysets with study_count >= observed.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: rows and their number of exceedances in n_draws
+    """
+    from scipy.sparse import csc_matrix
+
+    rng = np.random.default_rng(seed)
+    study_n = sum(n for _, n in strata)
+    term_idx = np.concatenate(
+        [
+            np.concatenate([rng.choice(pool, n, replace=False) for pool, n in strata])
+            for _ in range(n_draws)
+        ]
+    )
+    draw_idx = np.repeat(np.arange(n_draws), study_n)
+    draws = csc_matrix(
+        (np.ones(len(term_idx), dtype=np.int32), (term_idx, draw_idx)),
+        shape=(matrix.shape[1], n_draws),
+    )
+    counts = (matrix[rows] @ draws).toarray()  # (rows x draws) study counts
+
+    return rows, (counts >= observed[:, None]).sum(axis=1)
+
+
+def _init_worker(matrix: csr_matrix, strata: Strata) -> None:
+    """Pass the read-only data to each worker once, instead of with each chunk."""
+    _worker_state["matrix"] = matrix
+    _worker_state["strata"] = strata
+
+
+def _count_exceedances_worker(seed, n_draws, rows, observed):
+    return count_exceedances(
+        _worker_state["matrix"], _worker_state["strata"], seed, n_draws, rows, observed
+    )
+
+
+class _SerialExecutor(Executor):
+    """Runs submitted chunks in the calling process (n_jobs=1)."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future: Future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def empirical_pvalues(
+    matrix: csr_matrix,
+    strata: Strata,
+    observed: np.ndarray,
+    n_permutations: int = 10000,
+    precision: Optional[float] = 0.1,
+    n_jobs: int = 1,
+    seed=None,
+    chunk_size: int = 500,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Empirical one-sided p-values P(study_count >= observed) for every row of matrix.
+
+    The p-value estimate is (exceedances + 1) / (draws + 1). A product stops sampling once the
+    standard error of its estimate is at most precision * p-value (after at least one chunk).
+
+    Args:
+        matrix (csr_matrix): (products x terms) incidence matrix
+        strata (Strata): pools of term columns to draw random studysets from
+        observed (np.ndarray): observed study_count of each row
+        n_permutations (int, optional): maximal number of random studysets. Defaults to 10000.
+        precision (float, optional): relative precision for early stopping, None to disable. Defaults to 0.1.
+        n_jobs (int, optional): number of worker processes. Defaults to 1.
+        seed (optional): seed for np.random.SeedSequence. Defaults to None.
+        chunk_size (int, optional): random studysets per task. Defaults to 500.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: p-values and number of random studysets used, per row
+    """
+    n_rows = matrix.shape[0]
+    exceed = np.zeros(n_rows, dtype=np.int64)
+    n_drawn = np.zeros(n_rows, dtype=np.int64)
+    active = np.ones(n_rows, dtype=bool)
+    chunk_sizes = [
+        min(chunk_size, n_permutations - start)
+        for start in range(0, n_permutations, chunk_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    executor: Executor
+    if n_jobs == 1:
+        executor = _SerialExecutor()
+
+        def submit(i: int, rows: np.ndarray) -> Future:
+            return executor.submit(
+                count_exceedances,
+                matrix,
+                strata,
+                seeds[i],
+                chunk_sizes[i],
+                rows,
+                observed[rows],
+            )
+
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_worker, initargs=(matrix, strata)
+        )
+
+        def submit(i: int, rows: np.ndarray) -> Future:
+            return executor.submit(
+                _count_exceedances_worker,
+                seeds[i],
+                chunk_sizes[i],
+                rows,
+                observed[rows],
+            )
+
+    with executor:
+        pending: list[tuple[int, Future]] = []
+        next_chunk = 0
+        while True:
+            # keep n_jobs chunks in flight, each only for products which are not resolved yet
+            while (
+                len(pending) < n_jobs and next_chunk < len(chunk_sizes) and active.any()
+            ):
+                pending.append((next_chunk, submit(next_chunk, np.flatnonzero(active))))
+                next_chunk += 1
+            if not pending:
+                break
+            # chunks are consumed in order, so the result does not depend on n_jobs
+            i, future = pending.pop(0)
+            rows, chunk_exceed = future.result()
+            still_active = active[rows]
+            rows = rows[still_active]
+            exceed[rows] += chunk_exceed[still_active]
+            n_drawn[rows] += chunk_sizes[i]
+            if precision is not None:
+                pvals = (exceed[rows] + 1) / (n_drawn[rows] + 1)
+                stderr = np.sqrt(pvals * (1 - pvals) / n_drawn[rows])
+                active[rows[stderr <= precision * pvals]] = False
+        executor.shutdown(cancel_futures=True)
+
+    return (exceed + 1) / (n_drawn + 1), n_drawn
@@ -1,11 +1,18 @@
 from collections import defaultdict
 from typing import Union
 
-import requests
+from .timing import timed
+from .utils import (
+    NCBITaxon_to_gProfiler,
+    NCBITaxon_to_gProfiler_async,
+    ids_list,
+    request_json_async,
+)
 
-from .utils import NCBITaxon_to_gProfiler
+GCONVERT_URL = "https://biit.cs.ut.ee/gprofiler/api/convert/convert/"
 
 
+@timed("gConvert", lambda result, ids, *args, **kwargs: {"ids": len(ids)})
 def gConvert(ids: list[str], taxon, namespace: str) -> dict[str, list[str]]:
     """_summary_
 
@@ -17,17 +24,36 @@ def gConvert(ids: list[str], taxon, namespace: str) -> dict[str, list[str]]:
     Returns:
         dict[str, list[str]]: _description_
     """
+    import requests  # slow to import, only needed for network calls
+
     r = requests.post(
-        url="https://biit.cs.ut.ee/gprofiler/api/convert/convert/",
+        url=GCONVERT_URL,
+        json={
+            "organism": taxon,
+            "target": namespace,
+            "query": ids,
+        },
+    )
+    return _parse_gConvert(ids, r.json())
+
+
+async def gConvert_async(ids: list[str], taxon, namespace: str) -> dict[str, list[str]]:
+    """Awaitable gConvert."""
+    response = await request_json_async(
+        "POST",
+        GCONVERT_URL,
         json={
             "organism": taxon,
             "target": namespace,
             "query": ids,
         },
     )
+    return _parse_gConvert(ids, response)
 
+
+def _parse_gConvert(ids: list[str], response: dict) -> dict[str, list[str]]:
     converted_ids = defaultdict(list, {k: [] for k in ids})  # initialise with keys
-    result: list[dict] = r.json()["result"]
+    result: list[dict] = response["result"]
 
     for entry in result:
         entry_source_id = entry["incoming"]
@@ -52,26 +78,40 @@ def convert_ids(
 
     Raises:
         TypeError: _description_
+        ValueError: if database is not available
 
     Returns:
         _type_: _description_
     """
+    source_ids_list = _convert_ids_args(source_ids, taxon, database)
+
+    converted_taxon = NCBITaxon_to_gProfiler(taxon)
+    if not converted_taxon:
+        return {}
+    return gConvert(source_ids_list, converted_taxon, target_namespace)
+
+
+async def convert_ids_async(
+    source_ids: Union[str, list[str], set[str]],
+    taxon: str,
+    target_namespace: str = "ensg",
+    database: str = "gConvert",
+):
+    """Awaitable convert_ids, the requests do not block the event loop."""
+    source_ids_list = _convert_ids_args(source_ids, taxon, database)
+
+    converted_taxon = await NCBITaxon_to_gProfiler_async(taxon)
+    if not converted_taxon:
+        return {}
+    return await gConvert_async(source_ids_list, converted_taxon, target_namespace)
+
+
+def _convert_ids_args(
+    source_ids: Union[str, list[str], set[str]], taxon: str, database: str
+) -> list[str]:
+    """Check the arguments of convert_ids(_async), returns source_ids as a list."""
     if not isinstance(taxon, str):
         raise TypeError("taxons must be str")
-    if isinstance(source_ids, str):
-        source_ids_list = [source_ids]
-    if isinstance(source_ids, set):
-        source_ids_list = list(source_ids)
-    if isinstance(source_ids, list):
-        source_ids_list = source_ids
-
-    if database == "gConvert":
-        converted_taxon = NCBITaxon_to_gProfiler(taxon)
-        if not converted_taxon:
-            return {}
-        namespace = target_namespace
-        converted_ids = gConvert(source_ids_list, converted_taxon, namespace)
-    else:
-        return ValueError(f"database {database} is not available.")
-
-    return converted_ids
+    if database != "gConvert":
+        raise ValueError(f"database {database} is not available.")
+    return ids_list(source_ids)
@@ -0,0 +1,184 @@
+"""Reverse lookup index: which goterms are annotated to which products.
+
+None of it depends on the studyset, so GOReverseLookupStudy builds it once and reuses it for every
+run_study, until the Annotations change.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import numpy as np
+
+from .bitsets import intersection_counts, pack_columns, pack_rows
+
+if TYPE_CHECKING:
+    from scipy.sparse import csc_matrix, csr_matrix
+
+    from .associations import Annotations
+
+
+class ReverseLookupIndex:
+    """Sparse (products x terms) incidence matrix of Annotations.
+
+    Rows are object_ids, columns are term_ids (every term with at least one annotation).
+    The same (object_id, term_id) with different taxons counts once.
+    """
+
+    def __init__(
+        self, matrix: csr_matrix, object_ids: list[str], term_ids: list[str]
+    ) -> None:
+        self.matrix = matrix
+        self.object_ids = object_ids
+        self.term_ids = term_ids
+        self.object_index = {object_id: i for i, object_id in enumerate(object_ids)}
+        self.term_index = {term_id: i for i, term_id in enumerate(term_ids)}
+        # total number of goterms an objectid (product id) is associated in the whole population set
+        self.pop_counts = np.diff(matrix.indptr)
+        self._matrix_csc: Optional[csc_matrix] = None
+        self._term_ids_array = np.array(term_ids, dtype=object)
+        self._population_items: list[Optional[frozenset[str]]] = [None] * len(
+            object_ids
+        )
+        self._fingerprint: Optional[str] = None
+        self._packed: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_annotations(cls, anno: Annotations) -> ReverseLookupIndex:
+        return cls(*anno.incidence_matrix())
+
+    @property
+    def fingerprint(self) -> str:
+        """sha256 of the (object_id, term_id) pairs, independent of row and column order."""
+        if self._fingerprint is None:
+            coo = self.matrix.tocoo()
+            pairs = sorted(
+                zip(
+                    np.array(self.object_ids, dtype=object)[coo.row],
+                    self._term_ids_array[coo.col],
+                )
+            )
+            digest = hashlib.sha256()
+            for object_id, term_id in pairs:
+                digest.update(f"{object_id}\t{term_id}\n".encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @property
+    def matrix_csc(self) -> csc_matrix:
+        """Column (term -> products) view of the matrix."""
+        if self._matrix_csc is None:
+            self._matrix_csc = self.matrix.tocsc()
+        return self._matrix_csc
+
+    @property
+    def packed(self) -> np.ndarray:
+        """(products x words) uint64 bitsets of the terms of each product, built on first use
+        (products x terms / 8 bytes)."""
+        if self._packed is None:
+            self._packed = pack_rows(self.matrix)
+        return self._packed
+
+    def study_counts(self, studyset: Iterable[str]) -> np.ndarray:
+        """study_count of every product (AND + popcount of packed bitsets, no per-term work)."""
+        packed_set = pack_columns(self.term_columns(set(studyset)), len(self.term_ids))
+        return intersection_counts(self.packed, packed_set)
+
+    def term_columns(self, term_ids: Iterable[str]) -> np.ndarray:
+        """Columns of the given terms (terms without annotations are left out)."""
+        return np.array(
+            [self.term_index[t] for t in term_ids if t in self.term_index],
+            dtype=np.int64,
+        )
+
+    def matrix_for_terms(self, term_ids: list[str]) -> csr_matrix:
+        """(products x term_ids) incidence matrix with columns in the order of term_ids."""
+        from scipy.sparse import csr_matrix
+
+        new_cols = [j for j, t in enumerate(term_ids) if t in self.term_index]
+        cols = [self.term_index[term_ids[j]] for j in new_cols]
+        selection = csr_matrix(
+            (np.ones(len(cols), dtype=np.int32), (cols, new_cols)),
+            shape=(len(self.term_ids), len(term_ids)),
+        )
+        return (self.matrix @ selection).tocsr()
+
+    def study_items_csr(
+        self, studyset: Iterable[str]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Products with at least one studyset term and their studyset terms, CSR-style.
+
+        Only the columns of the studyset are visited, O(studyset annotations).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: product rows, offsets (indptr) and term columns;
+            the terms of rows[i] are cols[indptr[i]:indptr[i + 1]]
+        """
+        csc = self.matrix_csc
+        cols = self.term_columns(set(studyset))
+        starts = csc.indptr[cols]
+        lengths = csc.indptr[cols + 1] - starts
+        rows = np.concatenate(
+            [csc.indices[start : start + n] for start, n in zip(starts, lengths)]
+            or [np.array([], dtype=np.int32)]
+        )
+        terms = np.repeat(cols, lengths)
+
+        order = np.argsort(rows, kind="stable")
+        rows = rows[order]
+        products, first = np.unique(rows, return_index=True)
+        indptr = np.append(first, len(rows)).astype(np.int64)
+
+        return products, indptr, terms[order]
+
+    def study_items(self, studyset: Iterable[str]) -> tuple[np.ndarray, list[set[str]]]:
+        """Products with at least one studyset term and their studyset terms.
+
+        Returns:
+            tuple[np.ndarray, list[set[str]]]: product rows and study_items of each
+        """
+        products, indptr, cols = self.study_items_csr(studyset)
+        terms = self._term_ids_array[cols]
+        all_study_items = [
+            set(terms[start:end]) for start, end in zip(indptr[:-1], indptr[1:])
+        ]
+
+        return products, all_study_items
+
+    def study_counts_matrix(
+        self, studysets: list[Iterable[str]]
+    ) -> tuple[csr_matrix, np.ndarray]:
+        """study_count of every product for every studyset, from one sparse matrix product.
+
+        The studysets are encoded as a sparse (terms x studysets) indicator matrix S, so
+        matrix @ S holds the number of terms of each studyset annotated to each product.
+
+        Returns:
+            tuple[csr_matrix, np.ndarray]: (products x studysets) study counts and study_n of each studyset
+        """
+        from scipy.sparse import csr_matrix
+
+        study_n = np.array([len(studyset) for studyset in studysets], dtype=np.int64)
+        cols = [self.term_columns(set(studyset)) for studyset in studysets]
+        indicator = csr_matrix(
+            (
+                np.ones(sum(len(c) for c in cols), dtype=np.int32),
+                (
+                    np.concatenate(cols or [np.array([], dtype=np.int64)]),
+                    np.repeat(np.arange(len(studysets)), [len(c) for c in cols]),
+                ),
+            ),
+            shape=(len(self.term_ids), len(studysets)),
+        )
+
+        return (self.matrix @ indicator).tocsr(), study_n
+
+    def population_items(self, row: int) -> frozenset[str]:
+        """All terms of a product, built once."""
+        items = self._population_items[row]
+        if items is None:
+            start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+            items = frozenset(self._term_ids_array[self.matrix.indices[start:end]])
+            self._population_items[row] = items
+        return items
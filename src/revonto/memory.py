@@ -0,0 +1,182 @@
+"""Memory footprint of GODag, Annotations and GOReverseLookupStudy, and peak memory of stages.
+
+footprint reports the deep size (objects, their attributes and containers, NumPy/SciPy buffers) of
+each component in bytes. Objects shared between components (e.g. term id strings) are counted in
+the first component which reaches them, so the components of one report add up to its total.
+
+track_peaks traces allocations with tracemalloc (which slows Python down noticeably, so it is
+opt-in). While it is active, the timing spans of the instrumented stages (see revonto.timing)
+carry the peak traced memory of their call in peak_bytes: the peak above the memory traced when the
+call started, so memory held by earlier calls or by the caller is not included.
+
+Example:
+    >>> footprint(godag)
+    {'dict': 2621536, 'terms': 31457280, 'strings': 8388608, 'closures': 0, 'total': 42467424}
+    >>> with track_peaks() as tracker, timing.collect() as spans:
+    ...     anno = Annotations.from_file("goa_human.gaf")
+    >>> tracker.peak, spans[0].peak_bytes
+"""
+
+from __future__ import annotations
+
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from types import FunctionType, ModuleType
+from typing import Any, Iterator, Optional
+
+# [traced memory at start, running absolute peak] of the measurements in progress (outermost first)
+_span_peaks: list[list[int]] = []
+
+
+def deep_sizeof(
+    *objs: Any, seen: Optional[set[int]] = None, strings: Optional[list[int]] = None
+) -> int:
+    """Deep size in bytes of objects and everything reachable from them.
+
+    Args:
+        *objs: objects to measure
+        seen (set[int], optional): ids of objects already counted, updated. Defaults to None.
+        strings (list[int], optional): if given, sizes of str objects are added to strings[0]
+            instead of the result. Defaults to None.
+
+    Returns:
+        int: bytes (classes, functions and modules are not counted)
+    """
+    import numpy as np  # revonto.timing imports this module, keep GODag imports light
+
+    seen = set() if seen is None else seen
+    size = 0
+    stack = list(objs)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, FunctionType, ModuleType)):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, str):
+            if strings is not None:
+                strings[0] += sys.getsizeof(obj)
+                continue
+            size += sys.getsizeof(obj)
+            continue
+        size += sys.getsizeof(obj)
+        if isinstance(obj, np.ndarray):
+            if obj.base is not None:  # view, the buffer belongs to the base
+                stack.append(obj.base)
+            if obj.dtype == object:
+                stack.extend(obj.ravel().tolist())
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                stack.append(getattr(obj, slot))
+    return size
+
+
+def footprint(obj: Any) -> dict[str, int]:
+    """Deep memory footprint of a GODag, Annotations or GOReverseLookupStudy by component.
+
+    - GODag: dict (the term_id table), terms (GOTerm objects), strings, closures (cached
+      descendants)
+    - Annotations: set (the hash table), annotations (Annotation objects), strings, metadata
+      (attributes of the set)
+    - GOReverseLookupStudy: index (incl. packed bitsets and population items), populations
+      (incl. parent-child matrices), pval_cache, result_cache, logfactorial_table. anno and
+      obo_dag are not included, they have their own footprint.
+    Any other object is reported as total only.
+
+    Returns:
+        dict[str, int]: bytes of each component and their total
+    """
+    from .associations import Annotations
+    from .ontology import GODag
+    from .reverse_lookup import GOReverseLookupStudy
+
+    seen: set[int] = set()
+    if isinstance(obj, GODag):
+        strings = [0]
+        report = {
+            "dict": sys.getsizeof(obj),
+            "terms": deep_sizeof(*obj.values(), seen=seen, strings=strings),
+        }
+        report["strings"] = strings[0] + deep_sizeof(*obj.keys(), seen=seen)
+        report["closures"] = deep_sizeof(obj._descendants, seen=seen)
+        rest = obj.__dict__  # the dict itself is counted in "dict"
+    elif isinstance(obj, Annotations):
+        strings = [0]
+        report = {
+            "set": sys.getsizeof(obj),
+            "annotations": deep_sizeof(*obj, seen=seen, strings=strings),
+        }
+        report["strings"] = strings[0]
+        report["metadata"] = deep_sizeof(obj.__dict__, seen=seen)
+        rest = obj.__dict__
+    elif isinstance(obj, GOReverseLookupStudy):
+        # the study refers to them, but they are reported separately
+        seen.update((id(obj.anno), id(obj.obo_dag), id(obj.executor)))
+        report = {
+            "index": deep_sizeof(obj._index, seen=seen),
+            "populations": deep_sizeof(obj._populations, obj._parent_child, seen=seen),
+            "pval_cache": deep_sizeof(obj.pval_cache, seen=seen),
+            "result_cache": deep_sizeof(obj.result_cache, seen=seen),
+            "logfactorial_table": deep_sizeof(obj._logfact_table, seen=seen),
+        }
+        rest = obj
+    else:
+        return {"total": deep_sizeof(obj)}
+    report["total"] = sum(report.values()) + deep_sizeof(rest, seen=seen)
+    return report
+
+
+class PeakTracker:
+    """Peak traced memory of a track_peaks block above the memory traced when it started (bytes, set
+    when the block ends)."""
+
+    def __init__(self) -> None:
+        self.peak: Optional[int] = None
+
+
+@contextmanager
+def track_peaks() -> Iterator[PeakTracker]:
+    """Trace allocations with tracemalloc inside the with block.
+
+    tracemalloc is started (and stopped at the end) unless it is already tracing. Peaks are
+    process wide: allocations of other threads are included and the peaks of concurrent calls
+    (threads, coroutines) are not separated.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracker = PeakTracker()
+    _span_start()
+    try:
+        yield tracker
+    finally:
+        tracker.peak = _span_end()
+        if started:
+            tracemalloc.stop()
+
+
+def _span_start() -> None:
+    """Start a nested peak measurement (called by revonto.timing when tracing)."""
+    current, peak = tracemalloc.get_traced_memory()
+    if _span_peaks:
+        # the peak so far belongs to the enclosing measurement, reset_peak forgets it
+        _span_peaks[-1][1] = max(_span_peaks[-1][1], peak)
+    tracemalloc.reset_peak()
+    _span_peaks.append([current, current])
+
+
+def _span_end() -> int:
+    """Peak traced memory since the matching _span_start, above the memory traced at its start."""
+    start, peak = _span_peaks.pop()
+    peak = max(peak, tracemalloc.get_traced_memory()[1])
+    if _span_peaks:
+        _span_peaks[-1][1] = max(_span_peaks[-1][1], peak)
+    return peak - start
@@ -1,65 +1,169 @@
-from statsmodels.stats.multitest import (  # TODO: in future only import when needed and only once
-    multipletests,
-)
+from typing import Callable, Optional
 
+import numpy as np
 
-def bonferroni(pvals: list[float], a) -> list[float]:
+from .timing import timed
+
+# All native corrections work on the last axis of a float array; multiple_correction moves the
+# requested axis there. With the default axis=0, each column of a 2-D array (e.g. p-values of many
+# studies, one study per column) is corrected as a separate family.
+# NaN marks a missing test (e.g. product not tested in one of the studies): it stays NaN and is not
+# counted in the size of its family.
+# With axis=None all tests of the array are one family (e.g. every (product, studyset) pair).
+
+
+def bonferroni(pvals: np.ndarray, a) -> np.ndarray:
     """bonferroni correction
 
     Args:
-        pvals (_type_): _description_
-        a (_type_): _description_
+        pvals (np.ndarray): uncorrected p-values, families along the last axis
+        a (float): family-wise error rate (not needed for corrected p-values)
 
     Returns:
-        _type_: _description_
+        np.ndarray: corrected p-values
     """
-    n = len(pvals)
-    corrected_pvals = [min(p * n, 1) for p in pvals]
+    n = _family_size(pvals)
+    return np.minimum(pvals * n, 1)
+
+
+def sidak(pvals: np.ndarray, a) -> np.ndarray:
+    """sidak correction: 1 - (1 - p)^n"""
+    n = _family_size(pvals)
+    return -np.expm1(n * np.log1p(-pvals))
+
+
+def holm(pvals: np.ndarray, a) -> np.ndarray:
+    """holm (step-down bonferroni) correction"""
+    n = _family_size(pvals)
+    order = np.argsort(pvals, axis=-1)  # NaN are sorted last
+    sorted_pvals = np.take_along_axis(pvals, order, axis=-1)
+    corrected = np.fmax.accumulate(
+        sorted_pvals * (n - np.arange(pvals.shape[-1])), axis=-1
+    )
+    return _unsort(np.minimum(corrected, 1), sorted_pvals, order)
+
+
+def fdr_bh(pvals: np.ndarray, a) -> np.ndarray:
+    """benjamini/hochberg false discovery rate correction"""
+    n = _family_size(pvals)
+    order = np.argsort(pvals, axis=-1)  # NaN are sorted last
+    sorted_pvals = np.take_along_axis(pvals, order, axis=-1)
+    corrected = sorted_pvals * n / np.arange(1, pvals.shape[-1] + 1)
+    corrected = np.fmin.accumulate(corrected[..., ::-1], axis=-1)[..., ::-1]
+    return _unsort(np.minimum(corrected, 1), sorted_pvals, order)
+
+
+def fdr_by(pvals: np.ndarray, a) -> np.ndarray:
+    """benjamini/yekutieli false discovery rate correction (for dependent tests)"""
+    n = _family_size(pvals)
+    harmonic = np.concatenate(([0], np.cumsum(1 / np.arange(1, pvals.shape[-1] + 1))))
+    return np.minimum(fdr_bh(pvals, a) * harmonic[n], 1)
+
+
+def _family_size(pvals: np.ndarray) -> np.ndarray:
+    """number of tests (not NaN) in each family"""
+    return np.sum(~np.isnan(pvals), axis=-1, keepdims=True)
+
+
+def _unsort(
+    sorted_values: np.ndarray, sorted_pvals: np.ndarray, order: np.ndarray
+) -> np.ndarray:
+    """put values sorted by order back in the original positions, missing tests stay NaN"""
+    sorted_values = np.where(np.isnan(sorted_pvals), np.nan, sorted_values)
+    values = np.empty_like(sorted_values)
+    np.put_along_axis(values, order, sorted_values, axis=-1)
+    return values
 
-    return corrected_pvals
 
+native_methods: dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    "bonferroni": bonferroni,
+    "sidak": sidak,
+    "holm": holm,
+    "fdr_bh": fdr_bh,
+    "fdr_by": fdr_by,
+}
 
-def multiple_correction(pvals: list[float], method: str, a=0.05) -> list[float]:
-    """_summary_
+statsmodels_methods = [
+    "bonferroni",
+    "sidak",
+    "holm-sidak",
+    "holm",
+    "simes-hochberg",
+    "hommel",
+    "fdr_bh",
+    "fdr_by",
+    "fdr_tsbh",
+    "fdr_tsbky",
+]
+
+
+@timed("multiple_correction", lambda pvals, *args, **kwargs: {"tests": pvals.size})
+def multiple_correction(
+    pvals, method: str, a=0.05, axis: Optional[int] = 0
+) -> np.ndarray:
+    """Correct p-values for multiple testing.
 
     Args:
-        pvals (_type_): _description_
+        pvals (array_like): uncorrected p-values, 1-D or N-D. NaN for missing tests.
         method (str): selected method. statsmodels method are prefixed by sm_
-        a (float, optional): _description_. Defaults to 0.05.
+        a (float, optional): family-wise error rate / false discovery rate. Defaults to 0.05.
+        axis (int, optional): axis along which the families are. Defaults to 0 (columns of 2-D array).
+            1 corrects each row of a 2-D array, None corrects all p-values as one family.
 
     Raises:
-        NotImplemented: _description_
-        ValueError: _description_
+        ValueError: if method is not available
 
     Returns:
-        _type_: _description_
+        np.ndarray: corrected p-values, same shape as pvals
     """
-    corrected_pvals: list[float]
-    if method == "bonferroni":
-        corrected_pvals = bonferroni(pvals, a)
-    elif method == "holm":
-        raise NotImplementedError
-    elif method == "sidak":
-        raise NotImplementedError
-    elif method == "fdr_bh":
-        raise NotImplementedError
-    elif "sm_" in method:
+    pvals = np.asarray(pvals, dtype=float)
+    if method in native_methods:
+        correction = native_methods[method]
+    elif method[:3] == "sm_":
         test_name = method[3:]
-        if test_name not in [
-            "bonferroni",
-            "sidak",
-            "holm-sidak",
-            "holm",
-            "simes-hochberg",
-            "hommel",
-            "fdr_bh",
-            "fdr_by",
-            "fdr_tsbh",
-            "fdr_tsbky",
-        ]:
+        if test_name not in statsmodels_methods:
             raise ValueError(f"{method} not in statsmodels multipletests")
-        corrected_pvals = list(multipletests(pvals, a, "bonferroni")[1])
+        # statsmodels is slow to import, so it is only imported when one of its methods is used
+        from statsmodels.stats.multitest import multipletests
+
+        def _multipletests(p):
+            corrected = np.full_like(p, np.nan)
+            tested = ~np.isnan(p)
+            if tested.any():
+                corrected[tested] = multipletests(p[tested], a, test_name)[1]
+            return corrected
+
+        def correction(pvals, a):
+            return np.apply_along_axis(_multipletests, -1, pvals)
+
     else:
         raise ValueError(f"{method} not in available methods")
 
-    return corrected_pvals
+    if pvals.ndim == 0 or pvals.size == 0:
+        return pvals.copy()
+
+    if axis is None:
+        return correction(pvals.reshape(1, -1), a).reshape(pvals.shape)
+
+    corrected_pvals = correction(np.moveaxis(pvals, axis, -1), a)
+
+    return np.moveaxis(corrected_pvals, -1, axis)
+
+
+def uncorrected_threshold(method: str, a: float, n: int) -> float:
+    """Largest uncorrected p-value which can still have a corrected p-value <= a among n tests.
+
+    For these methods, p-values above the threshold can not make other p-values significant,
+    which allows skipping the exact calculation of p-values which are certainly above it.
+
+    Raises:
+        ValueError: for methods without such a threshold (e.g. two-stage fdr, hommel)
+    """
+    test_name = method[3:] if method[:3] == "sm_" else method
+    if test_name == "bonferroni":
+        return a / n
+    if test_name == "sidak":
+        return float(-np.expm1(np.log1p(-a) / n))
+    if test_name in ("holm", "holm-sidak", "simes-hochberg", "fdr_bh", "fdr_by"):
+        return a
+    raise ValueError(f"{method} does not support pruning of non-significant p-values")
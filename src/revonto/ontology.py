@@ -3,8 +3,11 @@ Read and store Gene Ontology's obo file.
 Part of code has been taken from H Tang et al. 2018 (https://github.com/tanghaibao/goatools)
 """
 # -*- coding: UTF-8 -*-
+import hashlib
 import os
-from typing import Optional, Set
+from typing import Iterable, Optional, Set, Union
+
+from .timing import timed
 
 # if TYPE_CHECKING:
 #    from .Metrics import Metrics, basic_mirna_score
@@ -188,8 +191,12 @@ class GODag(dict[str, GOTerm]):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # term_id -> all descendant term_ids, filled on demand by descendants()
+        self._descendants: dict[str, frozenset[str]] = {}
+        self._fingerprint: Optional[str] = None
 
     @classmethod
+    @timed("GODag.from_file", lambda godag, *args, **kwargs: {"terms": len(godag)})
     def from_file(cls, file, load_obsolete=False):
         """Read obo file. Store results."""
         reader = OBOReader(file)
@@ -229,8 +236,94 @@ class GODag(dict[str, GOTerm]):
         )
         return desc
 
+    def descendants(self, term_id: str) -> frozenset[str]:
+        """All descendant GO IDs of term_id (like GOTerm.get_all_children).
+
+        Closures are cached on the GODag and each one is built from the cached closures of the
+        children, so every term is expanded once. Call clear_closure_cache if the DAG changes.
+        """
+        closure = self._descendants.get(term_id)
+        if closure is None:
+            closure = frozenset().union(
+                *(
+                    {child.term_id} | self.descendants(child.term_id)
+                    for child in self[term_id].children
+                )
+            )
+            self._descendants[term_id] = closure
+        return closure
+
+    def clear_closure_cache(self) -> None:
+        """Forget cached descendant closures and fingerprint (after the DAG changed)."""
+        self._descendants.clear()
+        self._fingerprint = None
+
+    def fingerprint(self) -> str:
+        """sha256 of the terms, their namespaces and parents (cached, see clear_closure_cache)."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for term_id in sorted(self):
+                term = self[term_id]
+                parents = ",".join(sorted(parent.term_id for parent in term.parents))
+                digest.update(f"{term_id}\t{term.namespace}\t{parents}\n".encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def expand(
+        self,
+        term_ids: Iterable[str],
+        max_depth: Optional[int] = None,
+        namespace: Optional[Union[str, Iterable[str]]] = None,
+    ) -> set[str]:
+        """Expand terms to themselves and all their descendants.
+
+        Terms which are descendants of other given terms are redundant and are not expanded again.
+        Terms not in the GODag are kept as they are.
+
+        Args:
+            term_ids (Iterable[str]): terms to expand
+            max_depth (int, optional): only descendants at most max_depth levels below a given term. Defaults to None.
+            namespace (Union[str, Iterable[str]], optional): only keep terms of these namespaces. Defaults to None.
+
+        Returns:
+            set[str]: expanded terms
+        """
+        term_ids = set(term_ids)
+        known = [term_id for term_id in term_ids if term_id in self]
+        expanded = term_ids.difference(known)
+        if max_depth is None:
+            # largest closures first, so redundant terms are found in the expanded set
+            for term_id in sorted(known, key=lambda t: -len(self.descendants(t))):
+                if term_id not in expanded:
+                    expanded.add(term_id)
+                    expanded |= self.descendants(term_id)
+        else:
+            # breadth-first, levels below the given terms
+            level = set(known)
+            expanded |= level
+            for _ in range(max_depth):
+                level = {
+                    child.term_id
+                    for term_id in level
+                    for child in self[term_id].children
+                    if child.term_id not in expanded
+                }
+                if not level:
+                    break
+                expanded |= level
+
+        if namespace is not None:
+            namespaces = {namespace} if isinstance(namespace, str) else set(namespace)
+            expanded = {
+                term_id
+                for term_id in expanded
+                if term_id not in self or self[term_id].namespace in namespaces
+            }
+        return expanded
+
     def _populate_terms(self):
         """Convert GO IDs to GO Term record objects. Populate children."""
+        self.clear_closure_cache()
 
         # Make parents and relationships references to the actual GO terms.
         for rec in self.values():
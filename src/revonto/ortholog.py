@@ -1,11 +1,19 @@
+import asyncio
 from collections import defaultdict
 from typing import Union
 
-import requests
+from .timing import timed
+from .utils import (
+    NCBITaxon_to_gProfiler,
+    NCBITaxon_to_gProfiler_async,
+    ids_list,
+    request_json_async,
+)
 
-from .utils import NCBITaxon_to_gProfiler
+GORTH_URL = "https://biit.cs.ut.ee/gprofiler_archive3/e108_eg55_p17/api/orth/orth/"
 
 
+@timed("gOrth", lambda result, source_ids, *args, **kwargs: {"ids": len(source_ids)})
 def gOrth(
     source_ids: list[str], source_taxon: str, target_taxon: str
 ) -> dict[str, list[str]]:
@@ -16,17 +24,38 @@ def gOrth(
         source_taxon (str): _description_
         target_taxon (str): _description_
     """
+    import requests  # slow to import, only needed for network calls
+
     r = requests.post(
-        url="https://biit.cs.ut.ee/gprofiler_archive3/e108_eg55_p17/api/orth/orth/",
+        url=GORTH_URL,
         json={
             "organism": source_taxon,
             "target": target_taxon,
             "query": source_ids,
         },
     )
+    return _parse_gOrth(source_ids, r.json())
+
 
+async def gOrth_async(
+    source_ids: list[str], source_taxon: str, target_taxon: str
+) -> dict[str, list[str]]:
+    """Awaitable gOrth."""
+    response = await request_json_async(
+        "POST",
+        GORTH_URL,
+        json={
+            "organism": source_taxon,
+            "target": target_taxon,
+            "query": source_ids,
+        },
+    )
+    return _parse_gOrth(source_ids, response)
+
+
+def _parse_gOrth(source_ids: list[str], response: dict) -> dict[str, list[str]]:
     target_ids = defaultdict(list, {k: [] for k in source_ids})  # initialise with keys
-    result: list[dict] = r.json()["result"]
+    result: list[dict] = response["result"]
     for entry in result:
         entry_source_id = entry["incoming"]
         if entry["ortholog_ensg"] not in ["N/A", "None", None]:
@@ -50,31 +79,55 @@ def find_orthologs(
 
     Raises:
         NotImplementedError: _description_
+        ValueError: if database is not available
 
     Returns:
         _type_: _description_
     """
+    source_ids_list = _find_orthologs_args(
+        source_ids, source_taxon, target_taxon, database
+    )
+
+    source_taxon = NCBITaxon_to_gProfiler(source_taxon)
+    target_taxon = NCBITaxon_to_gProfiler(target_taxon)
+    if not source_taxon or not target_taxon:
+        return {}
+    return gOrth(source_ids_list, source_taxon, target_taxon)
+
+
+async def find_orthologs_async(
+    source_ids: Union[str, list[str], set[str]],
+    source_taxon: str,
+    target_taxon: str = "9606",
+    database: str = "gOrth",
+) -> dict[str, list[str]]:
+    """Awaitable find_orthologs, the requests do not block the event loop."""
+    source_ids_list = _find_orthologs_args(
+        source_ids, source_taxon, target_taxon, database
+    )
+
+    source_taxon, target_taxon = await asyncio.gather(
+        NCBITaxon_to_gProfiler_async(source_taxon),
+        NCBITaxon_to_gProfiler_async(target_taxon),
+    )
+    if not source_taxon or not target_taxon:
+        return {}
+    return await gOrth_async(source_ids_list, source_taxon, target_taxon)
+
+
+def _find_orthologs_args(
+    source_ids: Union[str, list[str], set[str]],
+    source_taxon: str,
+    target_taxon: str,
+    database: str,
+) -> list[str]:
+    """Check the arguments of find_orthologs(_async), returns source_ids as a list."""
     if not isinstance(source_taxon, str) and not isinstance(target_taxon, str):
         raise TypeError("taxons must be str")
-
-    if isinstance(source_ids, str):
-        source_ids_list = [source_ids]
-    if isinstance(source_ids, set):
-        source_ids_list = list(source_ids)
-    if isinstance(source_ids, list):
-        source_ids_list = source_ids
-
-    if database == "gOrth":
-        source_taxon = NCBITaxon_to_gProfiler(source_taxon)
-        target_taxon = NCBITaxon_to_gProfiler(target_taxon)
-        if not source_taxon or not target_taxon:
-            return {}
-        target_ids_dict = gOrth(source_ids_list, source_taxon, target_taxon)
-    elif database == "local_files":
-        raise NotImplementedError
-    else:
-        ValueError(
+    if database == "local_files":
+        raise NotImplementedError("local ortholog files are not supported yet")
+    if database != "gOrth":
+        raise ValueError(
             f"database {database} is not available as a source of ortholog information"
         )
-
-    return target_ids_dict
+    return ids_list(source_ids)
@@ -0,0 +1,213 @@
+"""Run many studies of one GOReverseLookupStudy on a process pool.
+
+The reverse lookup index (sparse products x terms matrix) is copied once into shared memory
+blocks. Workers attach to them when they start, so neither the index nor the GODag/Annotations
+are pickled with each task; a task only carries its studysets. Results are yielded as soon as
+a worker finishes them.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from .index import ReverseLookupIndex
+from .population import Population
+from .reverse_lookup import GOReverseLookupStudy
+
+if TYPE_CHECKING:
+    from multiprocessing.context import BaseContext
+
+    from .results import ResultsTable
+    from .reverse_lookup import ReverseLookupRecord
+
+# (shared memory name, shape, dtype) of an array in shared memory
+ArraySpec = tuple[str, tuple[int, ...], str]
+
+_worker_state: dict = {}
+
+
+def _share_array(array: np.ndarray) -> tuple[shared_memory.SharedMemory, ArraySpec]:
+    """Copy array into a new shared memory block."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach_array(spec: ArraySpec) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    """Read-only view of an array in shared memory (no copy)."""
+    name, shape, dtype = spec
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)  # python >= 3.13
+    except TypeError:
+        # workers share the resource tracker of the parent, which owns (and unlinks) the block
+        shm = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    array.flags.writeable = False
+    return shm, array
+
+
+class _SharedIndexStudy(GOReverseLookupStudy):
+    """GOReverseLookupStudy of a worker, on the index attached from shared memory."""
+
+    def __init__(self, index: ReverseLookupIndex, population: Population, **kws):
+        super().__init__(None, None, **kws)  # type: ignore[arg-type]
+        self._shared_index = index
+        self._shared_population = population
+
+    @property
+    def index(self) -> ReverseLookupIndex:
+        return self._shared_index
+
+    def _population(self) -> Population:
+        return self._shared_population
+
+
+def _init_worker(
+    specs: dict[str, ArraySpec],
+    shape: tuple[int, int],
+    object_ids: list[str],
+    term_ids: list[str],
+    population: Population,
+    study_kws: dict,
+) -> None:
+    """Attach to the shared index once per worker."""
+    from scipy.sparse import csr_matrix
+
+    arrays = {}
+    for key, spec in specs.items():
+        shm, arrays[key] = _attach_array(spec)
+        _worker_state.setdefault("shm", []).append(shm)  # keep the blocks mapped
+    matrix = csr_matrix(
+        (arrays["data"], arrays["indices"], arrays["indptr"]), shape=shape, copy=False
+    )
+    index = ReverseLookupIndex(matrix, object_ids, term_ids)
+    _worker_state["study"] = _SharedIndexStudy(index, population, **study_kws)
+
+
+def _run_studies_worker(
+    positions: list[int], studysets: list[list[str]], kws: dict
+) -> tuple[list[int], list[list[ReverseLookupRecord]]]:
+    return positions, _worker_state["study"].run_studies(studysets, **kws)
+
+
+class ParallelReverseLookup:
+    """Process pool running the studies of a GOReverseLookupStudy.
+
+    Use as a context manager (or call close), which shuts down the workers and frees the shared memory.
+
+    Example:
+        >>> with ParallelReverseLookup(study, n_jobs=4) as parallel:
+        ...     for i, results in parallel.run_studies(studysets):
+        ...         ...
+    """
+
+    def __init__(
+        self,
+        study: GOReverseLookupStudy,
+        n_jobs: Optional[int] = None,
+        mp_context: Optional[BaseContext] = None,
+        chunk_size: int = 16,
+    ):
+        """
+        Args:
+            study (GOReverseLookupStudy): study whose index, population and settings are used
+            n_jobs (int, optional): number of worker processes. Defaults to None (number of cpus).
+            mp_context (BaseContext, optional): multiprocessing context ("fork" or "spawn"). Defaults to None.
+            chunk_size (int, optional): studysets per task. Defaults to 16.
+        """
+        self.study = study
+        self.chunk_size = chunk_size
+        index = study.index
+        self._shm: list[shared_memory.SharedMemory] = []
+        specs = {}
+        for key in ("data", "indices", "indptr"):
+            shm, specs[key] = _share_array(getattr(index.matrix, key))
+            self._shm.append(shm)
+        study_kws = {
+            "alpha": study.alpha,
+            "pvalcalc": study.pval_method,
+            "methods": study.methods,
+        }
+        self._executor = ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(
+                specs,
+                index.matrix.shape,
+                index.object_ids,
+                index.term_ids,
+                study._population(),  # pickled once per worker
+                study_kws,
+            ),
+        )
+
+    def run_studies(
+        self, studysets: Iterable[Union[set[str], list[str]]], **kws
+    ) -> Iterator[tuple[int, Union[list[ReverseLookupRecord], ResultsTable]]]:
+        """Run a study for each studyset, yielding results in order of completion.
+
+        Args:
+            studysets (Iterable[Union[set[str], list[str]]]): studysets
+            **kws: methods, alpha, keep_if, as_table and expand options as in
+                GOReverseLookupStudy.run_studies
+
+        Yields:
+            tuple[int, Union[list[ReverseLookupRecord], ResultsTable]]: position of the studyset and
+                its results
+        """
+        if kws.get("algorithm", self.study.algorithm) != "classic":
+            raise ValueError(
+                "workers have no GODag, only the classic algorithm is supported"
+            )
+        if kws.get("family", "studyset") != "studyset":
+            # each task only sees its own studysets
+            raise ValueError("only per studyset corrections are supported")
+        keep_if = kws.pop("keep_if", None)  # lambdas can not be sent to workers
+        # workers have no GODag, studysets are expanded here
+        studysets = [
+            list(self.study._expand_studyset(studyset, kws)) for studyset in studysets
+        ]
+        kws.pop("expand", None)
+        pending: set[Future] = {
+            self._executor.submit(
+                _run_studies_worker,
+                list(range(start, min(start + self.chunk_size, len(studysets)))),
+                studysets[start : start + self.chunk_size],
+                kws,
+            )
+            for start in range(0, len(studysets), self.chunk_size)
+        }
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    positions, all_results = future.result()
+                    for i, results in zip(positions, all_results):
+                        if keep_if is not None and kws.get("as_table", False):
+                            results = results.filter([keep_if(r) for r in results])
+                        elif keep_if is not None:
+                            results = [r for r in results if keep_if(r)]
+                        yield i, results
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self) -> None:
+        """Shut down the workers and free the shared memory."""
+        self._executor.shutdown(cancel_futures=True)
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+    def __enter__(self) -> ParallelReverseLookup:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,79 @@
+"""Population of GO terms a reverse lookup study draws its studyset from.
+
+The population defines pop_n (number of terms) and the pop_count of each product (number of its
+terms in the population). A restricted population also drops studyset terms outside of it, so
+study_n and study_count are counted within the population as well.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Optional, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .index import ReverseLookupIndex
+    from .ontology import GODag
+
+# "all", "annotated", a namespace or an explicit collection of term ids
+PopulationSpec = Union[str, Iterable[str]]
+
+
+class Population:
+    """Population terms with pop_n and the pop_count of every product of the index."""
+
+    def __init__(
+        self, term_ids: Optional[frozenset[str]], pop_n: int, pop_counts: np.ndarray
+    ) -> None:
+        """
+        Args:
+            term_ids (frozenset[str], optional): population terms, None for an unrestricted population
+            pop_n (int): number of terms in the population
+            pop_counts (np.ndarray): pop_count of each product (index row)
+        """
+        self.term_ids = term_ids
+        self.pop_n = pop_n
+        self.pop_counts = pop_counts
+
+    @classmethod
+    def from_spec(
+        cls, spec: PopulationSpec, godag: GODag, index: ReverseLookupIndex
+    ) -> Population:
+        """Resolve a population.
+
+        Args:
+            spec (PopulationSpec): "all" (every GODag term; studysets and pop_counts are not
+                restricted, as in earlier versions), "annotated" (GODag terms with at least one
+                annotation), a namespace (e.g. "biological_process") or a collection of term ids.
+                Obsolete terms and terms not in the GODag are not part of restricted populations.
+            godag (GODag): ontology
+            index (ReverseLookupIndex): index of the annotations
+
+        Raises:
+            ValueError: if spec is a string which is not a known population or namespace
+
+        Returns:
+            Population: population with precomputed pop_n and pop_counts
+        """
+        if isinstance(spec, str) and spec == "all":
+            return cls(None, len(godag), index.pop_counts.astype(np.int64))
+
+        live = (term_id for term_id, term in godag.items() if not term.is_obsolete)
+        if isinstance(spec, str) and spec == "annotated":
+            term_ids = frozenset(t for t in live if t in index.term_index)
+        elif isinstance(spec, str):
+            term_ids = frozenset(t for t in live if godag[t].namespace == spec)
+            if not term_ids:
+                raise ValueError(f"{spec} is not a population or a namespace in GODag")
+        else:
+            term_ids = frozenset(spec).intersection(live)
+
+        indicator = np.zeros(len(index.term_ids), dtype=np.int64)
+        indicator[index.term_columns(term_ids)] = 1
+        return cls(term_ids, len(term_ids), index.matrix @ indicator)
+
+    def filter(self, studyset: Iterable[str]) -> Iterable[str]:
+        """studyset without the terms outside of the population."""
+        if self.term_ids is None:
+            return studyset
+        return [term_id for term_id in studyset if term_id in self.term_ids]
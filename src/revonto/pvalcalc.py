@@ -1,5 +1,13 @@
-"""Options for calculating uncorrected p-values."""
-from scipy import stats
+"""Options for calculating uncorrected p-values.
+
+scipy is slow to import, so it is only imported by the functions which need it.
+"""
+from typing import Iterator, Optional
+
+import numpy as np
+
+from .cache import LRUCache
+from .timing import timed
 
 
 def fisherscipystats(study_count, study_n, pop_count, pop_n) -> float:
@@ -14,6 +22,8 @@ def fisherscipystats(study_count, study_n, pop_count, pop_n) -> float:
     Returns:
         _type_: _description_
     """
+    from scipy import stats
+
     avar = study_count
     bvar = study_n - study_count
     cvar = pop_count - study_count
@@ -24,7 +34,199 @@ def fisherscipystats(study_count, study_n, pop_count, pop_n) -> float:
     return pval
 
 
+def fisherscipystats_batch(study_count, study_n, pop_count, pop_n) -> np.ndarray:
+    """One-sided (greater) Fisher's exact test for arrays of study_count and pop_count.
+
+    Same as fisherscipystats, but all tables are evaluated in one vectorized call to the
+    hypergeometric survival function: P(X >= study_count) with X ~ Hypergeom(pop_n, pop_count, study_n).
+
+    Args:
+        study_count (array_like): study counts, one per product
+        study_n (int or array_like): N of study set, shared by all products or one per product
+        pop_count (array_like): population counts, one per product
+        pop_n (int): N of population set, shared by all products
+
+    Returns:
+        np.ndarray: p-values, one per product
+    """
+    from scipy import stats
+
+    study_count = np.asarray(study_count)
+    pval = stats.hypergeom.sf(study_count - 1, pop_n, pop_count, study_n)
+
+    return np.clip(pval, 0, 1)
+
+
+class LogFactorialTable:
+    """Precomputed log(k!) for k = 0..n.
+
+    The population size is fixed for a study, so the table is built once (O(pop_n)) and every exact
+    hypergeometric tail is afterwards summed from table lookups in log space.
+    """
+
+    def __init__(self, n: int) -> None:
+        from scipy import special
+
+        self.n = n
+        self.logfact = special.gammaln(np.arange(n + 1, dtype=float) + 1)
+
+    def log_binom(self, n, k) -> np.ndarray:
+        """log of binomial coefficient n choose k (element-wise, -inf where k > n or k < 0)"""
+        n = np.asarray(n)
+        k = np.asarray(k)
+        valid = (k >= 0) & (k <= n)
+        n_ = np.where(valid, n, 0)
+        k_ = np.where(valid, k, 0)
+        return np.where(
+            valid,
+            self.logfact[n_] - self.logfact[k_] - self.logfact[n_ - k_],
+            -np.inf,
+        )
+
+    def log_hypergeom_sf(
+        self, study_count, study_n, pop_count, pop_n, max_tail_terms: int = 2**18
+    ) -> np.ndarray:
+        """log P(X >= study_count), X ~ Hypergeom(pop_n, pop_count, study_n).
+
+        Tails are summed with logsumexp, so p-values far below the float range are still exact.
+        Products are sorted by tail length and summed in blocks of at most max_tail_terms tail terms
+        (about 8 bytes each per temporary), so memory does not grow with the batch.
+        """
+        from scipy import special
+
+        if pop_n > self.n:
+            raise ValueError(f"table size {self.n} is smaller than pop_n {pop_n}")
+        study_count = np.atleast_1d(np.asarray(study_count, dtype=np.int64))
+        pop_count = np.atleast_1d(np.asarray(pop_count, dtype=np.int64))
+        if study_count.size == 0:
+            return np.zeros(study_count.shape)
+        study_n = np.broadcast_to(
+            np.asarray(study_n, dtype=np.int64), study_count.shape
+        )
+        upper = np.minimum(pop_count, study_n)  # largest possible study_count
+        lower = np.maximum(study_count, study_n - (pop_n - pop_count))
+        tail_lens = np.maximum(upper - lower + 1, 1)
+        log_total = self.log_binom(pop_n, study_n)
+
+        log_sf = np.empty(study_count.shape)
+        for rows, tail_len in _tail_blocks(tail_lens, max_tail_terms):
+            # one row of tail terms per product
+            x = lower[rows, None] + np.arange(tail_len)
+            log_pmf = (
+                self.log_binom(pop_count[rows, None], x)
+                + self.log_binom(pop_n - pop_count[rows, None], study_n[rows, None] - x)
+                - log_total[rows, None]
+            )
+            log_pmf[x > upper[rows, None]] = -np.inf
+            log_sf[rows] = special.logsumexp(log_pmf, axis=1)
+
+        return np.minimum(log_sf, 0)
+
+
+def _tail_blocks(
+    tail_lens: np.ndarray, max_tail_terms: int
+) -> Iterator[tuple[np.ndarray, int]]:
+    """(rows, longest tail) blocks of products sorted by tail length, each with
+    rows x longest tail <= max_tail_terms (or a single row)"""
+    order = np.argsort(tail_lens, kind="stable")
+    sorted_lens = tail_lens[order]
+    start = 0
+    while start < len(order):
+        # the last row of a block has its longest tail: largest end with (end - start) rows fitting
+        low, high = start + 1, min(
+            start + max(max_tail_terms // int(sorted_lens[start]), 1), len(order)
+        )
+        while low < high:
+            mid = (low + high + 1) // 2
+            if (mid - start) * int(sorted_lens[mid - 1]) <= max_tail_terms:
+                low = mid
+            else:
+                high = mid - 1
+        yield order[start:low], int(sorted_lens[low - 1])
+        start = low
+
+
+_shared_table: Optional[LogFactorialTable] = None
+
+
+def shared_table(n: int) -> LogFactorialTable:
+    """LogFactorialTable of at least n, shared by the calls which are not given a table.
+
+    It grows (at least doubling) when a larger n is requested, so scalar calls with changing
+    pop_n do not rebuild an O(pop_n) table each time.
+    """
+    global _shared_table
+    table = _shared_table
+    if table is None or table.n < n:
+        table = LogFactorialTable(n if table is None else max(n, 2 * table.n))
+        _shared_table = table
+    return table
+
+
+def fisherlogfactorial(
+    study_count, study_n, pop_count, pop_n, table: Optional[LogFactorialTable] = None
+) -> np.ndarray:
+    """One-sided (greater) Fisher's exact test summed from a log-factorial table.
+
+    Args:
+        study_count (array_like): study counts, one per product
+        study_n (int): N of study set
+        pop_count (array_like): population counts, one per product
+        pop_n (int): N of population set
+        table (LogFactorialTable, optional): precomputed table of at least pop_n. Defaults to
+            shared_table(pop_n).
+
+    Returns:
+        np.ndarray: p-values, one per product
+    """
+    if table is None:
+        table = shared_table(pop_n)
+    return np.exp(table.log_hypergeom_sf(study_count, study_n, pop_count, pop_n))
+
+
+def fisher_lower_bound(
+    study_count, study_n, pop_count, pop_n, table: Optional[LogFactorialTable] = None
+) -> np.ndarray:
+    """Cheap lower bound of the one-sided Fisher p-value P(X >= study_count).
+
+    The median of a hypergeometric distribution is the floor or the ceiling of its mean, so the
+    p-value is at least 0.5 when study_count is not above floor(mean). Otherwise P(X = study_count),
+    the first term of the tail, is used (a single table lookup in log space).
+
+    Args:
+        study_count (array_like): study counts, one per product
+        study_n (int): N of study set
+        pop_count (array_like): population counts, one per product
+        pop_n (int): N of population set
+        table (LogFactorialTable, optional): precomputed table of at least pop_n. Defaults to
+            shared_table(pop_n).
+
+    Returns:
+        np.ndarray: lower bounds of p-values, one per product
+    """
+    study_count = np.asarray(study_count, dtype=np.int64)
+    pop_count = np.asarray(pop_count, dtype=np.int64)
+    study_n = np.broadcast_to(np.asarray(study_n, dtype=np.int64), study_count.shape)
+    bound = np.full(study_count.shape, 0.5)
+    above = study_count > (pop_count * study_n) // pop_n
+    if above.any():
+        if table is None:
+            table = shared_table(pop_n)
+        log_pmf = (
+            table.log_binom(pop_count[above], study_count[above])
+            + table.log_binom(
+                pop_n - pop_count[above], study_n[above] - study_count[above]
+            )
+            - table.log_binom(pop_n, study_n[above])
+        )
+        bound[above] = np.exp(log_pmf)
+
+    return bound
+
+
 def binomialscipystats(study_count, study_n, pop_count, pop_n) -> float:
+    from scipy import stats
+
     k = study_count
     n = study_n
     p = pop_count / pop_n
@@ -37,9 +239,137 @@ def binomialscipystats(study_count, study_n, pop_count, pop_n) -> float:
 def pvalue_calculate(study_count, study_n, pop_count, pop_n, method) -> float:
     if method == "fisher_scipy_stats":
         pval = fisherscipystats(study_count, study_n, pop_count, pop_n)
+    elif method == "fisher_logfactorial":
+        pval = float(fisherlogfactorial(study_count, study_n, pop_count, pop_n)[0])
     elif method == "binomial_scipy_stats":
         pval = binomialscipystats(study_count, study_n, pop_count, pop_n)
     else:
         raise ValueError(f"{method} is not an available method for calculating pvalue")
 
     return pval
+
+
+@timed("pvalues", lambda pvals, *args, **kwargs: {"tests": pvals.size})
+def pvalue_calculate_batch(
+    study_count,
+    study_n,
+    pop_count,
+    pop_n,
+    method,
+    table: Optional[LogFactorialTable] = None,
+) -> np.ndarray:
+    """Calculate pvalues for many products at once (pop_n is shared, study_n can be shared or an array).
+
+    Methods without a vectorized implementation fall back to pvalue_calculate for each product.
+    table is only used by "fisher_logfactorial"; pass it to reuse it between calls.
+    """
+    study_count = np.asarray(study_count, dtype=np.int64)
+    pop_count = np.asarray(pop_count, dtype=np.int64)
+    if study_count.shape != pop_count.shape:
+        raise ValueError("study_count and pop_count must have the same shape")
+    study_n = np.broadcast_to(np.asarray(study_n, dtype=np.int64), study_count.shape)
+
+    if method == "fisher_scipy_stats":
+        pvals = fisherscipystats_batch(study_count, study_n, pop_count, pop_n)
+    elif method == "fisher_logfactorial":
+        pvals = fisherlogfactorial(
+            study_count.ravel(), study_n.ravel(), pop_count.ravel(), pop_n, table
+        ).reshape(study_count.shape)
+    elif method == "binomial_scipy_stats":
+        pvals = np.array(
+            [
+                binomialscipystats(int(sc), int(sn), int(pc), pop_n)
+                for sc, sn, pc in zip(
+                    study_count.ravel(), study_n.ravel(), pop_count.ravel()
+                )
+            ],
+            dtype=float,
+        ).reshape(study_count.shape)
+    else:
+        raise ValueError(f"{method} is not an available method for calculating pvalue")
+
+    return pvals
+
+
+class PvalueCache(LRUCache):
+    """Bounded (LRU) memoization of p-values keyed by method and contingency table.
+
+    The key is (method, study_count, study_n, pop_count, pop_n). One instance can be shared by many
+    run_study calls and by many studies. hits/misses are counted per requested p-value, so hit_rate
+    is the fraction of p-values which did not have to be calculated. It is safe to share between
+    threads (concurrent batches may both calculate a missing p-value, but store the same value).
+    An entry takes about 200 bytes, so the default maxsize bounds a cache to about 13 MB.
+    """
+
+    def __init__(self, maxsize: int = 2**16) -> None:
+        super().__init__(maxsize)
+
+    def pvalue_calculate(self, study_count, study_n, pop_count, pop_n, method) -> float:
+        """Memoized pvalue_calculate."""
+        key = (method, int(study_count), int(study_n), int(pop_count), int(pop_n))
+        pval = self._get(key)
+        if pval is None:
+            self._count(0, 1)
+            pval = pvalue_calculate(study_count, study_n, pop_count, pop_n, method)
+            self._set(key, pval)
+        else:
+            self._count(1, 0)
+        return pval
+
+    def pvalue_calculate_batch(
+        self,
+        study_count,
+        study_n,
+        pop_count,
+        pop_n,
+        method,
+        table: Optional[LogFactorialTable] = None,
+    ) -> np.ndarray:
+        """Memoized pvalue_calculate_batch.
+
+        Identical tables within the batch are calculated once, tables not in the cache are calculated
+        in a single batched call.
+        """
+        study_count = np.asarray(study_count, dtype=np.int64)
+        pop_count = np.asarray(pop_count, dtype=np.int64)
+        if study_count.shape != pop_count.shape:
+            raise ValueError("study_count and pop_count must have the same shape")
+
+        study_n = np.broadcast_to(
+            np.asarray(study_n, dtype=np.int64), study_count.shape
+        )
+
+        tables = np.stack(
+            [study_count.ravel(), study_n.ravel(), pop_count.ravel()], axis=1
+        )
+        unique_tables, inverse, multiplicity = np.unique(
+            tables, axis=0, return_inverse=True, return_counts=True
+        )
+        unique_pvals = np.empty(len(unique_tables))
+        missing = []
+        for i, (sc, sn, pc) in enumerate(unique_tables.tolist()):
+            pval = self._get((method, sc, sn, pc, pop_n))
+            if pval is None:
+                missing.append(i)
+            else:
+                unique_pvals[i] = pval
+        if missing:
+            unique_pvals[missing] = pvalue_calculate_batch(
+                unique_tables[missing, 0],
+                unique_tables[missing, 1],
+                unique_tables[missing, 2],
+                pop_n,
+                method,
+                table=table,
+            )
+            for i in missing:
+                sc, sn, pc = unique_tables[i].tolist()
+                self._set((method, sc, sn, pc, pop_n), float(unique_pvals[i]))
+
+        self._count(int(multiplicity.sum()) - len(missing), len(missing))
+
+        return unique_pvals[inverse.reshape(-1)].reshape(study_count.shape)
+
+
+# used by every study which is not given its own cache
+shared_pval_cache = PvalueCache()
@@ -0,0 +1,318 @@
+"""Columnar results of a reverse lookup study.
+
+ResultsTable holds one NumPy array per column (object ids, counts and one column per p-value method)
+instead of one ReverseLookupRecord per product. Study items are stored CSR-style: the study items of
+row i are term_ids[study_items_indices[study_items_indptr[i]:study_items_indptr[i + 1]]].
+Sorting and filtering only reorder the arrays; ReverseLookupRecord objects are built when asked for.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+import pickle
+import threading
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from .cache import LRUCache
+
+if TYPE_CHECKING:
+    from .index import ReverseLookupIndex
+
+count_columns = ["study_count", "study_n", "pop_count", "pop_n"]
+
+
+class ReverseLookupRecord(object):
+    """Represents one result (from a single product) in the ReverseLookupStudy"""
+
+    def __init__(
+        self,
+        objid,
+        name=None,
+        pvals=None,
+        study_items=None,
+        population_items=None,
+        ratio_in_study=(0, 0),
+        ratio_in_pop=(0, 0),
+    ):
+        self.object_id = objid
+        self.name = name
+        # new containers for each record (mutable default arguments would be shared)
+        self.pvals = pvals if pvals is not None else {}
+        self.study_items = study_items if study_items is not None else set()
+        self.population_items = (
+            population_items if population_items is not None else set()
+        )
+        # Ex: ratio_in_pop ratio_in_study study_items p_uncorrected pop_items
+        self.study_count = ratio_in_study[0]
+        self.study_n = ratio_in_study[1]
+        self.pop_count = ratio_in_pop[0]
+        self.pop_n = ratio_in_pop[1]
+
+    def add_pval(self, method, pvalue: float):
+        """Pvalue to dict."""
+        self.pvals[method] = pvalue
+
+
+class ResultsTable:
+    """Columnar results of a study (one row per product)."""
+
+    def __init__(
+        self,
+        object_ids: np.ndarray,
+        counts: dict[str, np.ndarray],
+        pvals: dict[str, np.ndarray],
+        study_items_indptr: np.ndarray,
+        study_items_indices: np.ndarray,
+        term_ids: np.ndarray,
+        index: Optional[ReverseLookupIndex] = None,
+        rows: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            object_ids (np.ndarray): object_id of each row
+            counts (dict[str, np.ndarray]): study_count, study_n, pop_count and pop_n columns
+            pvals (dict[str, np.ndarray]): p-value columns ("uncorrected" and corrections)
+            study_items_indptr (np.ndarray): offsets of the study items of each row (len(self) + 1)
+            study_items_indices (np.ndarray): positions of the study items in term_ids
+            term_ids (np.ndarray): term ids referenced by study_items_indices
+            index (ReverseLookupIndex, optional): index for the population_items of records. Defaults to None.
+            rows (np.ndarray, optional): row of each product in index. Defaults to None.
+        """
+        self.object_ids = np.asarray(object_ids, dtype=object)
+        self.counts = {
+            column: np.asarray(counts[column], dtype=np.int64)
+            for column in count_columns
+        }
+        self.pvals = {
+            method: np.asarray(col, dtype=float) for method, col in pvals.items()
+        }
+        self.study_items_indptr = np.asarray(study_items_indptr, dtype=np.int64)
+        self.study_items_indices = np.asarray(study_items_indices, dtype=np.int64)
+        self.term_ids = np.asarray(term_ids, dtype=object)
+        self.index = index
+        self.rows = rows
+
+    @classmethod
+    def from_records(cls, records: Iterable[ReverseLookupRecord]) -> ResultsTable:
+        """Table of existing records (methods are the keys of the first record's pvals)."""
+        records = list(records)
+        methods = list(records[0].pvals) if records else []
+        term_index: dict[str, int] = {}
+        indices = [
+            term_index.setdefault(term_id, len(term_index))
+            for record in records
+            for term_id in sorted(record.study_items)
+        ]
+        return cls(
+            np.array([record.object_id for record in records], dtype=object),
+            {
+                column: np.array([getattr(record, column) for record in records])
+                for column in count_columns
+            },
+            {
+                method: np.array([record.pvals[method] for record in records])
+                for method in methods
+            },
+            np.cumsum([0] + [len(record.study_items) for record in records]),
+            np.array(indices, dtype=np.int64),
+            np.array(list(term_index), dtype=object),
+        )
+
+    def __len__(self) -> int:
+        return len(self.object_ids)
+
+    def __getstate__(self) -> dict:
+        # the index is not pickled, GOReverseLookupStudy attaches its own to tables from disk
+        state = self.__dict__.copy()
+        state["index"] = None
+        return state
+
+    @property
+    def methods(self) -> list[str]:
+        return list(self.pvals)
+
+    def column(self, name: str) -> np.ndarray:
+        """object_id, a count column or a p-value column."""
+        if name == "object_id":
+            return self.object_ids
+        if name in self.counts:
+            return self.counts[name]
+        if name in self.pvals:
+            return self.pvals[name]
+        raise KeyError(f"{name} not in columns")
+
+    def study_items(self, i: int) -> set[str]:
+        start, end = self.study_items_indptr[i], self.study_items_indptr[i + 1]
+        return set(self.term_ids[self.study_items_indices[start:end]])
+
+    def take(self, indices) -> ResultsTable:
+        """New table with the given rows, in the given order."""
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        starts = self.study_items_indptr[indices]
+        lengths = self.study_items_indptr[indices + 1] - starts
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        # position of every kept study item in study_items_indices
+        positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return ResultsTable(
+            self.object_ids[indices],
+            {column: values[indices] for column, values in self.counts.items()},
+            {method: values[indices] for method, values in self.pvals.items()},
+            indptr,
+            self.study_items_indices[positions],
+            self.term_ids,
+            self.index,
+            None if self.rows is None else self.rows[indices],
+        )
+
+    def filter(self, mask) -> ResultsTable:
+        """Rows where mask is True, e.g. table.filter(table.pvals["bonferroni"] < 0.05)."""
+        return self.take(np.flatnonzero(mask))
+
+    def sort(self, by: str = "uncorrected", descending: bool = False) -> ResultsTable:
+        """Rows sorted by a column (stable)."""
+        values = self.column(by)
+        if descending:
+            order = len(values) - 1 - np.argsort(values[::-1], kind="stable")[::-1]
+        else:
+            order = np.argsort(values, kind="stable")
+        return self.take(order)
+
+    def record(self, i: int, population_items: bool = True) -> ReverseLookupRecord:
+        """ReverseLookupRecord of row i (population_items left empty if not population_items)."""
+        items = (
+            self.index.population_items(self.rows[i])
+            if population_items and self.index is not None and self.rows is not None
+            else frozenset()
+        )
+        return ReverseLookupRecord(
+            self.object_ids[i],
+            pvals={method: float(values[i]) for method, values in self.pvals.items()},
+            study_items=self.study_items(i),
+            population_items=items,
+            ratio_in_study=(
+                int(self.counts["study_count"][i]),
+                int(self.counts["study_n"][i]),
+            ),
+            ratio_in_pop=(
+                int(self.counts["pop_count"][i]),
+                int(self.counts["pop_n"][i]),
+            ),
+        )
+
+    def __getitem__(self, key) -> Union[ReverseLookupRecord, ResultsTable]:
+        """Record of one row (int) or a table of rows (slice, index or boolean array)."""
+        if isinstance(key, (int, np.integer)):
+            return self.record(range(len(self))[key])
+        return self.take(np.arange(len(self))[key])
+
+    def __iter__(self) -> Iterator[ReverseLookupRecord]:
+        return self.iter_records()
+
+    def iter_records(
+        self, population_items: bool = True
+    ) -> Iterator[ReverseLookupRecord]:
+        return (self.record(i, population_items) for i in range(len(self)))
+
+    def to_records(self, population_items: bool = True) -> list[ReverseLookupRecord]:
+        return list(self.iter_records(population_items))
+
+    def to_tsv(self, file, header: bool = True) -> None:
+        """Write the table as tab separated values (study items are joined by ",").
+
+        Args:
+            file: path or text file object
+            header (bool, optional): write the column names first. Defaults to True.
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, "w", newline="") as f:
+                return self.to_tsv(f, header)
+        writer = csv.writer(file, delimiter="\t", lineterminator="\n")
+        if header:
+            writer.writerow(
+                ["object_id"] + count_columns + self.methods + ["study_items"]
+            )
+        for i in range(len(self)):
+            writer.writerow(
+                [self.object_ids[i]]
+                + [self.counts[column][i] for column in count_columns]
+                + [repr(float(self.pvals[method][i])) for method in self.methods]
+                + [",".join(sorted(self.study_items(i)))]
+            )
+
+    def to_parquet(self, path) -> None:
+        """Write the table to a Parquet file (needs pyarrow, pip install revonto[parquet])."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(
+                "pyarrow is needed to write Parquet files: pip install pyarrow"
+            ) from e
+
+        columns = {"object_id": pa.array(self.object_ids.tolist(), type=pa.string())}
+        columns.update(
+            (column, pa.array(self.counts[column])) for column in count_columns
+        )
+        columns.update(
+            (method, pa.array(self.pvals[method])) for method in self.methods
+        )
+        columns["study_items"] = pa.ListArray.from_arrays(
+            pa.array(self.study_items_indptr.astype(np.int32)),
+            pa.array(
+                self.term_ids[self.study_items_indices].tolist(), type=pa.string()
+            ),
+        )
+        pq.write_table(pa.table(columns), path)
+
+
+class ResultCache(LRUCache):
+    """Bounded (LRU) cache of study results (ResultsTable) keyed by a canonical hash of the query.
+
+    GOReverseLookupStudy builds the key from the studyset, p-value method, corrections, alpha, pruning
+    and the fingerprints of the annotations and the GODag, so changed data never hits stale results.
+    With path, tables are also pickled to path/<key>.pkl and found there by later processes
+    (files are neither evicted nor removed by clear). Tables are shared with the cache, do not modify their arrays in place.
+    The cache can be shared between threads.
+    """
+
+    def __init__(self, maxsize: int = 128, path=None) -> None:
+        super().__init__(maxsize)
+        self.path = path
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """sha256 of the JSON of parts (studysets must be given sorted)."""
+        return hashlib.sha256(
+            json.dumps(parts, separators=(",", ":"), default=str).encode()
+        ).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[ResultsTable]:
+        table = self._get(key)
+        if table is None and self.path is not None and os.path.isfile(self._file(key)):
+            with open(self._file(key), "rb") as f:
+                table = pickle.load(f)
+            self._set(key, table)
+        if table is None:
+            self._count(0, 1)
+        else:
+            self._count(1, 0)
+        return table
+
+    def set(self, key: str, table: ResultsTable) -> None:
+        self._set(key, table)
+        if self.path is not None:
+            # write to a temporary file first, so readers never see partial files
+            tmp = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._file(key))
@@ -1,43 +1,100 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import heapq
+import os
+import threading
 from collections import defaultdict
-from typing import TYPE_CHECKING, Union
+from typing import TYPE_CHECKING, Iterator, Optional, Union
+
+import numpy as np
 
 if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
     from .associations import Annotations
     from .ontology import GODag
 
-from .multiple_testing import multiple_correction
-from .pvalcalc import pvalue_calculate
-
-
-class ReverseLookupRecord(object):
-    """Represents one result (from a single product) in the ReverseLookupStudy"""
+from .empirical import build_strata, empirical_pvalues
+from .index import ReverseLookupIndex
+from .multiple_testing import multiple_correction, uncorrected_threshold
+from .population import Population, PopulationSpec
+from .pvalcalc import (
+    LogFactorialTable,
+    PvalueCache,
+    fisher_lower_bound,
+    shared_pval_cache,
+)
+from .results import ResultCache, ResultsTable, ReverseLookupRecord
+from .timing import timed
+from .topology import ParentChildTerms, below_counts, check_algorithm, keep_items
+
+# corrections whose corrected p-values of the smallest p-values do not depend on the larger ones
+_STEP_DOWN_METHODS = {
+    "bonferroni",
+    "sidak",
+    "holm",
+    "sm_bonferroni",
+    "sm_sidak",
+    "sm_holm",
+    "sm_holm-sidak",
+}
+
+# axis of the (products x studysets) p-value array along which run_studies corrects
+_family_axes: dict[str, Optional[int]] = {"studyset": 0, "product": 1, "all": None}
+
+
+class _StudyCounts:
+    """Study and population goterms of the products in one study."""
 
     def __init__(
         self,
-        objid,
-        name=None,
-        pvals={},
-        study_items=set(),
-        population_items=set(),
-        ratio_in_study=(0, 0),
-        ratio_in_pop=(0, 0),
+        index: ReverseLookupIndex,
+        rows: np.ndarray,
+        study_items_indptr: np.ndarray,
+        study_items_cols: np.ndarray,
+        study_n: Union[int, np.ndarray],
+        pop_n: Union[int, np.ndarray],
+        pop_counts: np.ndarray,
+        study_counts: Optional[np.ndarray] = None,
     ):
-        self.object_id = objid
-        self.name = name
-        self.pvals = pvals
-        self.study_items = study_items
-        self.population_items = population_items
-        # Ex: ratio_in_pop ratio_in_study study_items p_uncorrected pop_items
-        self.study_count = ratio_in_study[0]
-        self.study_n = ratio_in_study[1]
-        self.pop_count = ratio_in_pop[0]
-        self.pop_n = ratio_in_pop[1]
-
-    def add_pval(self, method, pvalue: float):
-        """Pvalue to dict."""
-        self.pvals[method] = pvalue
+        self.index = index
+        self.rows = rows
+        # study items of product i are index columns study_items_cols[indptr[i]:indptr[i + 1]]
+        self.study_items_indptr = study_items_indptr
+        self.study_items_cols = study_items_cols
+        # shared by all products, or one per product (parent_child algorithm)
+        self.study_n = study_n
+        self.pop_n = pop_n
+        # for each object id (product id) check how many goterms in study are associated to it
+        self.study_counts = (
+            np.diff(study_items_indptr) if study_counts is None else study_counts
+        )
+        # total number of goterms an objectid (product id) is associated in the whole population set
+        self.pop_counts = pop_counts
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def table(self, pvals: dict[str, np.ndarray]) -> ResultsTable:
+        """ResultsTable of all products, pvals has one column per method."""
+        n = len(self)
+        return ResultsTable(
+            np.array([self.index.object_ids[row] for row in self.rows], dtype=object),
+            {
+                "study_count": self.study_counts,
+                "study_n": np.broadcast_to(self.study_n, n).copy(),
+                "pop_count": self.pop_counts,
+                "pop_n": np.broadcast_to(self.pop_n, n).copy(),
+            },
+            pvals,
+            self.study_items_indptr,
+            self.study_items_cols,
+            self.index._term_ids_array,
+            index=self.index,
+            rows=self.rows,
+        )
 
 
 class GOReverseLookupStudy:
@@ -50,6 +107,13 @@ class GOReverseLookupStudy:
         alpha=0.05,
         pvalcalc="fisher_scipy_stats",
         methods=None,
+        pval_cache: Optional[PvalueCache] = None,  # None: shared_pval_cache
+        result_cache: Optional[ResultCache] = None,  # repeated queries, can be shared
+        population: PopulationSpec = "all",  # see Population.from_spec
+        algorithm: str = "classic",  # or "elim", "weight", "parent_child", see topology
+        executor: Optional[
+            Executor
+        ] = None,  # for the *_async methods, None: loop default
     ):
         self.anno = anno
         self.obo_dag = obo_dag
@@ -58,106 +122,744 @@ class GOReverseLookupStudy:
         if methods is None:
             self.methods = ["bonferroni"]  # add statsmodel multipletest
         self.pval_method = pvalcalc
-
+        self._logfact_table: Optional[LogFactorialTable] = None
+        self.pval_cache = pval_cache if pval_cache is not None else shared_pval_cache
+        self.result_cache = result_cache
+        self._index: Optional[ReverseLookupIndex] = None
+        self._index_anno: Optional[Annotations] = None
+        self._index_version = -1
+        self.population = population
+        self.algorithm = check_algorithm(algorithm)
+        # resolved populations of the current index, by spec
+        self._populations: dict[Union[str, frozenset[str]], Population] = {}
+        self._parent_child: dict[Union[str, frozenset[str]], ParentChildTerms] = {}
+        self._populations_index: Optional[ReverseLookupIndex] = None
+        self.executor = executor
+        # the index, populations and log-factorial table are built by one thread at a time
+        self._lock = threading.RLock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["executor"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @timed(
+        "run_study",
+        lambda results, self, studyset, **kws: {
+            "studyset": len(studyset),
+            "results": len(results),
+        },
+    )
     def run_study(
         self, studyset: Union[set[str], list[str]], **kws
-    ) -> list[ReverseLookupRecord]:
-        """_summary_
+    ) -> Union[list[ReverseLookupRecord], ResultsTable]:
+        """Run Gene Ontology Reverse Lookup Study
 
         Args:
-            study (_type_): list of all goterms (term_id) for a process-
+            studyset (Union[set[str], list[str]]): list of all goterms (term_id) for a process
+            **kws: methods, alpha, prune, top_k, keep_if, as_table (return a ResultsTable
+                instead of a list of records), population_items (fill population_items of
+                records, defaults to True), expand, expand_depth, expand_namespace (expand the
+                studyset to all descendants, see GODag.expand) and algorithm ("classic", "elim",
+                "weight" or "parent_child", see revonto.topology)
 
         Returns:
-            List[ReverseLookupRecord]: _description_
+            Union[list[ReverseLookupRecord], ResultsTable]: results
+        """
+        as_table = kws.get("as_table", False)
+        if len(studyset) == 0 and not as_table:
+            return []
+        studyset = self._expand_studyset(studyset, kws)
+
+        table = self._study_table(studyset, **kws)
+
+        # 'keep_if' can be used to keep only significant GO terms. Example:
+        #     >>> keep_if = lambda nt: nt.p_fdr_bh < 0.05 # if results are significant
+        #     >>> goea_results = goeaobj.run_study(geneids_study, keep_if=keep_if)
+        if as_table:
+            if "keep_if" in kws:
+                table = table.filter([kws["keep_if"](r) for r in table])
+            return table
+
+        # records are only built here, for callers which use lists of ReverseLookupRecord
+        results = table.to_records(kws.get("population_items", True))
+        if "keep_if" in kws:
+            keep_if = kws["keep_if"]
+            results = [r for r in results if keep_if(r)]
+
+        # Default sort order:
+        # results.sort(key=lambda r: [r.pvals["uncorrected"]])
+
+        return results  # list of ReverseLookupRecord objects
+
+    async def run_study_async(
+        self, studyset: Union[set[str], list[str]], **kws
+    ) -> Union[list[ReverseLookupRecord], ResultsTable]:
+        """Awaitable run_study, computed in self.executor without blocking the event loop.
+
+        Concurrent studies share the index, which is only built once. With the default (thread)
+        executor most of the work is done in NumPy/SciPy; a process executor pickles the study
+        (and its annotations) with every call.
         """
-        """Run Gene Ontology Reverse Lookup Study"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(self.run_study, studyset, **kws)
+        )
+
+    async def run_studies_async(
+        self, studysets: list[Union[set[str], list[str]]], **kws
+    ) -> list[list[ReverseLookupRecord]]:
+        """Awaitable run_studies, computed in self.executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(self.run_studies, studysets, **kws)
+        )
+
+    def iter_study(
+        self, studyset: Union[set[str], list[str]], chunk_size: int = 1000, **kws
+    ) -> Iterator[Union[list[ReverseLookupRecord], ResultsTable]]:
+        """Run Gene Ontology Reverse Lookup Study, yielding the results in chunks.
+
+        The study is computed as one ResultsTable (counts, p-values and the study items CSR of all
+        products) before the first chunk is yielded, since corrections need the p-values of every
+        product. Only ReverseLookupRecord objects (and their population_items) are built per chunk,
+        when it is yielded, so memory does not hold the records of all products. Empty chunks are
+        skipped.
+
+        Args:
+            studyset (Union[set[str], list[str]]): list of all goterms (term_id) for a process
+            chunk_size (int, optional): products per chunk. Defaults to 1000.
+            **kws: as in run_study, but population_items defaults to False
 
+        Yields:
+            Union[list[ReverseLookupRecord], ResultsTable]: records (or tables with as_table) of a chunk
+        """
         if len(studyset) == 0:
-            return []
+            return
+        studyset = self._expand_studyset(studyset, kws)
+        yield from self._chunks(self._study_table(studyset, **kws), chunk_size, kws)
+
+    def stream_study(
+        self,
+        studyset: Union[set[str], list[str]],
+        sink,
+        chunk_size: int = 1000,
+        **kws,
+    ) -> int:
+        """Run Gene Ontology Reverse Lookup Study, writing the results chunk by chunk.
+
+        Args:
+            studyset (Union[set[str], list[str]]): list of all goterms (term_id) for a process
+            sink: path or text file object (results are written as TSV, see ResultsTable.to_tsv),
+                or a callable which receives each chunk (as yielded by iter_study)
+            chunk_size (int, optional): products per chunk. Defaults to 1000.
+            **kws: as in iter_study
+
+        Returns:
+            int: number of results written
+        """
+        if callable(sink):
+            n_results = 0
+            for chunk in self.iter_study(studyset, chunk_size, **kws):
+                sink(chunk)
+                n_results += len(chunk)
+            return n_results
+        if isinstance(sink, (str, os.PathLike)):
+            with open(sink, "w", newline="") as f:
+                return self.stream_study(studyset, f, chunk_size, **kws)
+
+        kws["as_table"] = True
+        table = self._study_table(self._expand_studyset(studyset, kws), **kws)
+        table[:0].to_tsv(sink)  # header
+        n_results = 0
+        for chunk in self._chunks(table, chunk_size, kws):
+            chunk.to_tsv(sink, header=False)
+            n_results += len(chunk)
+        return n_results
+
+    def _expand_studyset(
+        self, studyset: Union[set[str], list[str]], kws: dict
+    ) -> Union[set[str], list[str]]:
+        """studyset expanded to descendants if kws["expand"] (unchanged otherwise)"""
+        if not kws.get("expand", False):
+            return studyset
+        return self.obo_dag.expand(
+            studyset,
+            max_depth=kws.get("expand_depth"),
+            namespace=kws.get("expand_namespace"),
+        )
+
+    @staticmethod
+    def _chunks(
+        table: ResultsTable, chunk_size: int, kws: dict
+    ) -> Iterator[Union[list[ReverseLookupRecord], ResultsTable]]:
+        keep_if = kws.get("keep_if")
+        population_items = kws.get("population_items", False)
+        for start in range(0, len(table), chunk_size):
+            chunk = table[start : start + chunk_size]
+            if kws.get("as_table", False):
+                if keep_if is not None:
+                    chunk = chunk.filter(
+                        [keep_if(r) for r in chunk.iter_records(population_items)]
+                    )
+                if len(chunk):
+                    yield chunk
+            else:
+                records = chunk.to_records(population_items)
+                if keep_if is not None:
+                    records = [r for r in records if keep_if(r)]
+                if records:
+                    yield records
+
+    def _study_table(self, studyset: Union[set[str], list[str]], **kws) -> ResultsTable:
+        """Counts, uncorrected and corrected pvalues of a study as a ResultsTable (keep_if not applied)."""
+        if self.result_cache is None:
+            return self._compute_study_table(studyset, **kws)
+
+        index = self.index
+        key = ResultCache.make_key(
+            sorted(studyset),
+            self.pval_method,
+            list(kws.get("methods", self.methods)),
+            kws.get("alpha", self.alpha),
+            kws.get("prune", False),
+            kws.get("top_k"),
+            kws.get("algorithm", self.algorithm),
+            (
+                self.population
+                if isinstance(self.population, str)
+                else sorted(self.population)
+            ),
+            index.fingerprint,
+            self.obo_dag.fingerprint(),
+        )
+        table = self.result_cache.get(key)
+        if table is None:
+            table = self._compute_study_table(studyset, **kws)
+            self.result_cache.set(key, table)
+        elif table.index is not index:
+            # from disk or from an older index with the same content
+            table.index = index
+            table.rows = np.array(
+                [index.object_index[object_id] for object_id in table.object_ids],
+                dtype=np.int64,
+            )
+        return table
 
+    def _compute_study_table(
+        self, studyset: Union[set[str], list[str]], **kws
+    ) -> ResultsTable:
         # process kwargs
         methods = kws.get("methods", self.methods)
         alpha = kws.get("alpha", self.alpha)
+        algorithm = check_algorithm(kws.get("algorithm", self.algorithm))
+
+        if kws.get("prune", False) or kws.get("top_k") is not None:
+            # only calculate the pvalues of products which can be significant (or in top_k)
+            return self._pruned_table(
+                studyset,
+                methods,
+                alpha,
+                top_k=kws.get("top_k"),
+                prune=kws.get("prune", False),
+                algorithm=algorithm,
+            )
 
         # calculate the uncorrected pvalues using the pvalcalc of choice
-        results = self.get_pval_uncorr(
-            studyset
-        )  # results is a list of ReverseLookupRecord objects
+        counts = self._count_study_items(studyset, algorithm)
+        uncorrected = self._pvalues(
+            counts, np.arange(len(counts)), self._logfactorial_table(counts.pop_n)
+        )
+        # do multipletest corrections on uncorrected pvalues
+        pvals = {"uncorrected": uncorrected}
+        pvals.update(
+            (method, multiple_correction(uncorrected, method, alpha))
+            for method in methods
+        )
+        return counts.table(pvals)
+
+    def run_studies(
+        self, studysets: list[Union[set[str], list[str]]], **kws
+    ) -> Union[list[list[ReverseLookupRecord]], list[ResultsTable]]:
+        """Run Gene Ontology Reverse Lookup Study for many studysets against the same population.
+
+        study_count of every product for every studyset comes from one sparse matrix product,
+        p-values are calculated in one batch and corrections are vectorized over the
+        (products x studysets) p-value array. The results of each studyset are a ResultsTable,
+        records are only built if as_table is not set.
+
+        Args:
+            studysets (list[Union[set[str], list[str]]]): list of studysets (lists of goterms)
+            **kws: methods, alpha, keep_if, as_table, population_items and expand options as in
+                run_study, and family: the tests corrected together, "studyset" (default, each
+                studyset as in run_study), "product" (each product across all studysets) or "all"
+                (every tested pair)
+
+        Returns:
+            Union[list[list[ReverseLookupRecord]], list[ResultsTable]]: results of each studyset,
+                same as run_study
+        """
+        family = kws.get("family", "studyset")
+        if family not in _family_axes:
+            raise ValueError(f"{family} not in families {list(_family_axes)}")
+        if check_algorithm(kws.get("algorithm", self.algorithm)) != "classic":
+            if family != "studyset":
+                raise ValueError(f"family {family} needs the classic algorithm")
+            # topology-aware counts are not a single matrix product
+            return [self.run_study(studyset, **kws) for studyset in studysets]
+        methods = kws.get("methods", self.methods)
+        alpha = kws.get("alpha", self.alpha)
+        population = self._population()
+        studysets = [
+            population.filter(self._expand_studyset(studyset, kws))
+            for studyset in studysets
+        ]
+
+        index = self.index
+        pop_n = population.pop_n
+        counts, study_n = index.study_counts_matrix(studysets)
+        counts = counts.tocoo()
+        # one entry per tested (product, studyset) pair, grouped by studyset
+        order = np.lexsort((counts.row, counts.col))
+        rows, cols = counts.row[order], counts.col[order]
+        study_counts = counts.data[order].astype(np.int64)
+        pop_counts = population.pop_counts[rows]
+
+        uncorrected = self.pval_cache.pvalue_calculate_batch(
+            study_counts,
+            study_n[cols],
+            pop_counts,
+            pop_n,
+            self.pval_method,
+            table=self._logfactorial_table(pop_n),
+        )
+        # (tested products x studysets), NaN where a product is not tested in a studyset
+        tested, positions = np.unique(rows, return_inverse=True)
+        pval_array = np.full((len(tested), len(studysets)), np.nan)
+        pval_array[positions, cols] = uncorrected
+        corrected = {
+            method: multiple_correction(
+                pval_array, method, alpha, axis=_family_axes[family]
+            )[positions, cols]
+            for method in methods
+        }
+
+        # pairs are grouped by studyset and sorted by product, as the rows of study_items_csr
+        bounds = np.searchsorted(cols, np.arange(len(studysets) + 1))
+        tables = []
+        for col, studyset in enumerate(studysets):
+            pairs = slice(bounds[col], bounds[col + 1])
+            study_rows, indptr, items = index.study_items_csr(studyset)
+            counts = _StudyCounts(
+                index,
+                study_rows,
+                indptr,
+                items,
+                study_n=int(study_n[col]),
+                pop_n=pop_n,
+                pop_counts=pop_counts[pairs],
+            )
+            pvals = {"uncorrected": uncorrected[pairs]}
+            pvals.update((method, corrected[method][pairs]) for method in methods)
+            tables.append(counts.table(pvals))
+
+        keep_if = kws.get("keep_if")
+        if kws.get("as_table", False):
+            if keep_if is not None:
+                tables = [table.filter([keep_if(r) for r in table]) for table in tables]
+            return tables
+
+        population_items = kws.get("population_items", True)
+        all_results = [table.to_records(population_items) for table in tables]
+        if keep_if is not None:
+            all_results = [
+                [r for r in results if keep_if(r)] for results in all_results
+            ]
+
+        return all_results
+
+    def run_study_empirical(
+        self,
+        studyset: Union[set[str], list[str]],
+        n_permutations: int = 10000,
+        match: Optional[str] = None,
+        precision: Optional[float] = 0.1,
+        n_jobs: int = 1,
+        seed=None,
+        chunk_size: int = 500,
+        **kws,
+    ) -> list[ReverseLookupRecord]:
+        """Run Gene Ontology Reverse Lookup Study with empirical (permutation) p-values.
+
+        Random studysets of the same size are drawn from the GO terms of obo_dag (matched by "depth"
+        or "namespace" if match is given). The empirical p-value becomes pvals["uncorrected"] and is
+        used for multiple test corrections, the analytic p-value is kept in pvals[pvalcalc].
+
+        Args:
+            studyset (Union[set[str], list[str]]): list of all goterms (term_id) for a process
+            n_permutations (int, optional): maximal number of random studysets. Defaults to 10000.
+            match (str, optional): None, "depth" or "namespace". Defaults to None.
+            precision (float, optional): stop sampling a product once the standard error of its
+                p-value is below precision * p-value. None to always draw n_permutations. Defaults to 0.1.
+            n_jobs (int, optional): number of worker processes. Defaults to 1.
+            seed (optional): seed, the result does not depend on n_jobs. Defaults to None.
+            chunk_size (int, optional): random studysets per worker task. Defaults to 500.
+            **kws: methods, alpha and keep_if as in run_study
+
+        Raises:
+            ValueError: for the elim, weight and parent_child algorithms (random studysets are
+                counted as in the classic test)
+
+        Returns:
+            list[ReverseLookupRecord]: results
+        """
+        if check_algorithm(kws.get("algorithm", self.algorithm)) != "classic":
+            raise ValueError(
+                "empirical p-values are only supported for the classic algorithm"
+            )
+        if len(studyset) == 0:
+            return []
+
+        methods = kws.get("methods", self.methods)
+        alpha = kws.get("alpha", self.alpha)
+
+        results = self.get_pval_uncorr(studyset, algorithm="classic")
         if not results:
             return []
 
-        # do multipletest corrections on uncorrected pvalues, add to ReverseLookupRecord objects
+        population = self._population()
+        studyset = population.filter(studyset)
+        term_ids = list(population.filter(self.obo_dag))
+        matrix = self.index.matrix_for_terms(term_ids)
+        indicator = np.isin(term_ids, list(studyset)).astype(np.int32)
+        rows = np.array([self.index.object_index[r.object_id] for r in results])
+        observed = matrix[rows] @ indicator
+        # products whose studyset terms are all missing from obo_dag get p-value 1
+        tested = observed > 0
+
+        empirical = np.ones(len(results))
+        empirical[tested], _ = empirical_pvalues(
+            matrix[rows[tested]],
+            build_strata(self.obo_dag, studyset, match, term_ids),
+            observed[tested],
+            n_permutations=n_permutations,
+            precision=precision,
+            n_jobs=n_jobs,
+            seed=seed,
+            chunk_size=chunk_size,
+        )
+        for rec, pval in zip(results, empirical):
+            rec.add_pval(self.pval_method, rec.pvals["uncorrected"])
+            rec.add_pval("uncorrected", float(pval))
+
         self._run_multitest_corr(results, methods, alpha)
 
-        # 'keep_if' can be used to keep only significant GO terms. Example:
-        #     >>> keep_if = lambda nt: nt.p_fdr_bh < 0.05 # if results are significant
-        #     >>> goea_results = goeaobj.run_study(geneids_study, keep_if=keep_if)
         if "keep_if" in kws:
             keep_if = kws["keep_if"]
             results = [r for r in results if keep_if(r)]
 
-        # Default sort order:
-        # results.sort(key=lambda r: [r.pvals["uncorrected"]])
-
-        return results  # list of ReverseLookupRecord objects
+        return results
 
     def get_pval_uncorr(
-        self, studyset: Union[set[str], list[str]]
+        self, studyset: Union[set[str], list[str]], algorithm: Optional[str] = None
     ) -> list[ReverseLookupRecord]:
-        """Calculate the uncorrected pvalues for study items."""
-        results = []
-
-        dict_by_object_id = self.anno.dict_from_attr("object_id")
-        dict_by_term_id = self.anno.dict_from_attr("term_id")
-
-        study2annoobjid = (
-            set()
-        )  # list of all annotation objects id from goterms in study
-        for term_id in studyset:
-            for annoobj in dict_by_term_id.get(term_id, set()):
-                study2annoobjid.add(annoobj.object_id)
-
-        for object_id in study2annoobjid:
-            # for each object id (product id) calculate pvalue
-            study_items = set(
-                anno_obj.term_id
-                for anno_obj in dict_by_object_id[object_id]
-                if anno_obj.term_id in studyset
-            )
-            study_count = len(
-                study_items
-            )  # for each object id (product id) check how many goterms in study are associated to it
-
-            if study_count == 0:
-                pass  # this ensures pvalcalc is only done with annotations with at least one association to study set of goterms.
+        """Calculate the uncorrected pvalues for study items (algorithm defaults to the study's)."""
+        counts = self._count_study_items(
+            studyset, check_algorithm(algorithm or self.algorithm)
+        )
 
-            study_n = len(studyset)  # N of study set
+        # all pvalues are calculated in one batched call, repeated tables are memoized
+        pvals = self._pvalues(
+            counts, np.arange(len(counts)), self._logfactorial_table(counts.pop_n)
+        )
 
-            population_items = set(
-                anno_obj.term_id for anno_obj in dict_by_object_id[object_id]
-            )
-            pop_count = len(
-                population_items
-            )  # total number of goterms an objectid (product id) is associated in the whole population set
+        return counts.table({"uncorrected": pvals}).to_records()
 
-            pop_n = len(self.obo_dag)  # total number of goterms in population set
+    def get_pval_pruned(
+        self,
+        studyset: Union[set[str], list[str]],
+        methods: list[str],
+        alpha: float,
+        top_k: Optional[int] = None,
+        prune: bool = True,
+    ) -> list[ReverseLookupRecord]:
+        """Calculate uncorrected and corrected pvalues only for products which can be significant.
+
+        A cheap lower bound of each product's p-value is calculated from its counts. With prune, products
+        whose bound is above the largest uncorrected p-value that can still pass alpha after correction
+        are skipped (without methods, nothing is skipped). With top_k, exact p-values are calculated
+        in order of increasing bound, keeping the k best in a heap, until the next bound can not beat
+        the k-th best p-value. The heap is only used
+        with single-step and step-down corrections (bonferroni, sidak, holm, holm-sidak), whose corrected
+        p-values of the k best do not depend on larger p-values. For step-up corrections (e.g. fdr_bh),
+        the exact p-values of all candidates are calculated and top_k only selects the rows returned.
+        Corrections count all tested products; skipped p-values enter them as 1, so corrected p-values
+        <= alpha are exact, larger ones may be overestimated.
+        """
+        return self._pruned_table(studyset, methods, alpha, top_k, prune).to_records()
 
-            one_record = ReverseLookupRecord(
-                object_id,
-                pvals={
-                    "uncorrected": pvalue_calculate(
-                        study_count, study_n, pop_count, pop_n, self.pval_method
-                    )
-                },
-                study_items=study_items,
-                population_items=population_items,
-                ratio_in_study=(study_count, study_n),
-                ratio_in_pop=(pop_count, pop_n),
+    def _pruned_table(
+        self,
+        studyset: Union[set[str], list[str]],
+        methods: list[str],
+        alpha: float,
+        top_k: Optional[int] = None,
+        prune: bool = True,
+        algorithm: str = "classic",
+    ) -> ResultsTable:
+        """get_pval_pruned as a ResultsTable"""
+        if self.pval_method not in ("fisher_scipy_stats", "fisher_logfactorial"):
+            raise ValueError(f"{self.pval_method} does not support pruning")
+        if algorithm == "parent_child":
+            raise ValueError(
+                "parent_child does not support pruning (pop_n per product)"
+            )
+        counts = self._count_study_items(studyset, algorithm)
+        n_tests = len(counts)
+        table = self._logfactorial_table(counts.pop_n, force=True)
+
+        lower_bounds = fisher_lower_bound(
+            counts.study_counts, counts.study_n, counts.pop_counts, counts.pop_n, table
+        )
+        candidates = np.arange(n_tests)
+        if prune and n_tests and methods:  # without corrections nothing is pruned
+            threshold = max(
+                uncorrected_threshold(method, alpha, n_tests) for method in methods
+            )
+            candidates = candidates[lower_bounds[candidates] <= threshold]
+
+        # p-values outside the heap enter the corrections as 1, which would inflate the corrected
+        # p-values of the kept products for step-up methods
+        use_heap = top_k is not None and all(m in _STEP_DOWN_METHODS for m in methods)
+        if use_heap:
+            kept, kept_pvals = self._top_k_pvalues(
+                counts, candidates, lower_bounds, top_k, table
             )
+        else:
+            kept = candidates
+            kept_pvals = self._pvalues(counts, kept, table)
+
+        all_pvals = np.ones(n_tests)
+        all_pvals[kept] = kept_pvals
+        pvals = {"uncorrected": all_pvals}
+        pvals.update(
+            (method, multiple_correction(all_pvals, method, alpha))
+            for method in methods
+        )
+
+        if top_k is not None and not use_heap:
+            # all candidates are exact, return the top_k (sorted as with the heap)
+            best = np.argsort(kept_pvals, kind="stable")[: max(top_k, 0)]
+            kept = kept[best]
+        return counts.table(pvals).take(kept)
+
+    def _pvalues(
+        self, counts: _StudyCounts, rows: np.ndarray, table: LogFactorialTable
+    ) -> np.ndarray:
+        study_n = counts.study_n
+        if np.ndim(study_n):
+            study_n = study_n[rows]
+        if not np.ndim(counts.pop_n):
+            return self.pval_cache.pvalue_calculate_batch(
+                counts.study_counts[rows],
+                study_n,
+                counts.pop_counts[rows],
+                counts.pop_n,
+                self.pval_method,
+                table=table,
+            )
+        # pop_n of each product: one batch per distinct pop_n
+        study_n = np.broadcast_to(study_n, rows.shape)
+        pop_n = counts.pop_n[rows]
+        pvals = np.empty(len(rows))
+        for value in np.unique(pop_n).tolist():
+            same = pop_n == value
+            pvals[same] = self.pval_cache.pvalue_calculate_batch(
+                counts.study_counts[rows[same]],
+                study_n[same],
+                counts.pop_counts[rows[same]],
+                value,
+                self.pval_method,
+                table=table,
+            )
+        return pvals
 
-            results.append(one_record)
+    def _top_k_pvalues(
+        self,
+        counts: _StudyCounts,
+        candidates: np.ndarray,
+        lower_bounds: np.ndarray,
+        top_k: int,
+        table: LogFactorialTable,
+        batch_size: int = 256,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """exact p-values of the top_k products with the smallest p-values (sorted)"""
+        if top_k <= 0:
+            return np.array([], dtype=np.int64), np.array([])
+        candidates = candidates[np.argsort(lower_bounds[candidates], kind="stable")]
+        heap: list[tuple[float, int]] = (
+            []
+        )  # max-heap of (-pvalue, row) of the best top_k
+        for start in range(0, len(candidates), batch_size):
+            batch = candidates[start : start + batch_size]
+            if len(heap) == top_k and lower_bounds[batch[0]] > -heap[0][0]:
+                break  # no remaining product can beat the k-th best
+            for row, pval in zip(batch, self._pvalues(counts, batch, table)):
+                if len(heap) < top_k:
+                    heapq.heappush(heap, (-pval, row))
+                elif pval < -heap[0][0]:
+                    heapq.heapreplace(heap, (-pval, row))
+        best = sorted((-neg_pval, row) for neg_pval, row in heap)
+
+        return (
+            np.array([row for _, row in best], dtype=np.int64),
+            np.array([pval for pval, _ in best]),
+        )
+
+    def _count_study_items(
+        self, studyset: Union[set[str], list[str]], algorithm: str = "classic"
+    ) -> _StudyCounts:
+        """Collect goterms in study and in population for each product with at least one study goterm."""
+        index = self.index
+        population = self._population()
+        studyset = population.filter(studyset)
+        rows, indptr, cols = index.study_items_csr(studyset)
+
+        counts = _StudyCounts(
+            index,
+            rows,
+            indptr,
+            cols,
+            study_n=len(studyset),  # N of study set
+            pop_n=population.pop_n,
+            pop_counts=population.pop_counts[rows],
+        )
+        if algorithm == "classic":
+            return counts
+        return self._topology_counts(counts, studyset, algorithm)
+
+    def _topology_counts(
+        self, counts: _StudyCounts, studyset: list[str], algorithm: str
+    ) -> _StudyCounts:
+        """Counts of the elim, weight or parent_child algorithm (see revonto.topology)."""
+        index, rows = counts.index, counts.rows
+        indptr, cols = counts.study_items_indptr, counts.study_items_cols
+        if algorithm == "parent_child":
+            kept, study_n, pop_counts, pop_n = self._parent_child_terms().counts(
+                index, rows, studyset, indptr, cols
+            )
+            indptr, cols = keep_items(indptr, cols, kept)
+            # products whose study items were all dropped are not tested (no parent annotated)
+            tested = np.diff(indptr) > 0
+            indptr = np.concatenate(([0], indptr[1:][tested]))
+            return _StudyCounts(
+                index,
+                rows[tested],
+                indptr,
+                cols,
+                study_n[tested],
+                pop_n[tested],
+                pop_counts[tested],
+            )
 
-        return results
+        study_cols, positions = np.unique(cols, return_inverse=True)
+        below = below_counts(
+            self.obo_dag, [index.term_ids[c] for c in study_cols], indptr, positions
+        )
+        study_counts = counts.study_counts
+        if algorithm == "elim":
+            indptr, cols = keep_items(indptr, cols, below == 0)
+            new_counts = np.diff(indptr)
+        else:  # weight
+            item_rows = np.repeat(np.arange(len(rows)), np.diff(indptr))
+            weights = np.bincount(item_rows, 1 / (1 + below), minlength=len(rows))
+            # rounded down (the small offset absorbs float error of sums like 3 * 1/3)
+            new_counts = np.floor(weights + 1e-9).astype(np.int64)
+        # the removed (or down-weighted) study terms are not counted in the population either
+        pop_counts = counts.pop_counts - (study_counts - new_counts)
+        return _StudyCounts(
+            index,
+            rows,
+            indptr,
+            cols,
+            counts.study_n,
+            counts.pop_n,
+            pop_counts,
+            study_counts=new_counts,
+        )
+
+    def _parent_child_terms(self) -> ParentChildTerms:
+        """Parent matrices of the population, built once per population and index."""
+        with self._lock:
+            population = self._population()
+            key = self._population_key()
+            terms = self._parent_child.get(key)
+            if terms is None:
+                terms = ParentChildTerms(self.obo_dag, self.index, population)
+                self._parent_child[key] = terms
+            return terms
+
+    @property
+    def pop_n(self) -> int:
+        """total number of goterms in population set"""
+        return self._population().pop_n
+
+    def _population(self) -> Population:
+        """Population of the study, resolved once per spec and index."""
+        with self._lock:
+            index = self.index
+            if self._populations_index is not index:
+                self._populations = {}
+                self._parent_child = {}
+                self._populations_index = index
+            key = self._population_key()
+            population = self._populations.get(key)
+            if population is None:
+                population = Population.from_spec(self.population, self.obo_dag, index)
+                self._populations[key] = population
+            return population
+
+    def _population_key(self) -> Union[str, frozenset[str]]:
+        spec = self.population
+        return spec if isinstance(spec, str) else frozenset(spec)
+
+    @property
+    def index(self) -> ReverseLookupIndex:
+        """Reverse lookup index of anno. Built once, rebuilt only if anno changed."""
+        if self._index_stale():
+            with self._lock:
+                if self._index_stale():  # not built by another thread in the meantime
+                    self._index = ReverseLookupIndex.from_annotations(self.anno)
+                    self._index_anno = self.anno
+                    self._index_version = self.anno._version
+        return self._index
+
+    def _index_stale(self) -> bool:
+        return (
+            self._index is None
+            or self._index_anno is not self.anno
+            or self._index_version != self.anno._version
+        )
+
+    def _logfactorial_table(
+        self, pop_n: Union[int, np.ndarray], force: bool = False
+    ) -> Optional[LogFactorialTable]:
+        """Log-factorial table, built once per study (pop_n is fixed, or its largest value).
+
+        Only needed by "fisher_logfactorial", unless force (p-value bounds).
+        """
+        if self.pval_method != "fisher_logfactorial" and not force:
+            return None
+        pop_n = int(np.max(pop_n, initial=0))  # one per product with parent_child
+        with self._lock:
+            if self._logfact_table is None or self._logfact_table.n < pop_n:
+                self._logfact_table = LogFactorialTable(pop_n)
+            return self._logfact_table
 
     def _run_multitest_corr(
         self, results: list[ReverseLookupRecord], methods: str, a: float
@@ -169,32 +871,83 @@ class GOReverseLookupStudy:
 
     @staticmethod
     def _update_pvalcorr(
-        results: list[ReverseLookupRecord], method: str, corrected_pvals: list[float]
+        results: list[ReverseLookupRecord], method: str, corrected_pvals: np.ndarray
     ):
         """Add data members to store multiple test corrections."""
         if corrected_pvals is None:
             return
         for rec, val in zip(results, corrected_pvals):
-            rec.add_pval(method, val)
+            rec.add_pval(method, float(val))
+
+
+def _group_by_object_id(
+    lists: tuple[list[ReverseLookupRecord], ...],
+) -> tuple[dict[str, list[ReverseLookupRecord]], dict[str, set[int]]]:
+    """One pass over all records: records of each object_id and the lists it is in."""
+    records: dict[str, list[ReverseLookupRecord]] = defaultdict(list)
+    present_in: dict[str, set[int]] = defaultdict(set)
+    for i, lst in enumerate(lists):
+        for record in lst:
+            records[record.object_id].append(record)
+            present_in[record.object_id].add(i)
+    return records, present_in
+
+
+def results_at_least(
+    k: int, *lists: list[ReverseLookupRecord]
+) -> dict[str, list[ReverseLookupRecord]]:
+    """object_ids present in at least k of the lists.
+
+    Returns:
+        dict[str, list[ReverseLookupRecord]]: key = object_id, value = its records, in order of the lists
+    """
+    records, present_in = _group_by_object_id(lists)
+    return {
+        object_id: object_records
+        for object_id, object_records in records.items()
+        if len(present_in[object_id]) >= k
+    }
 
 
 def results_intersection(
     *lists: list[ReverseLookupRecord],
 ) -> dict[str, list[ReverseLookupRecord]]:
-    intersection_dict = defaultdict(list)
-    # Create a dictionary of object_ids and their occurrences
-    object_id_counts: dict[str, int] = defaultdict(int)
-    for lst in lists:
-        for record in lst:
-            object_id_counts[record.object_id] += 1
-
-    # Find object_ids that occur in all lists
-    num_lists = len(lists)
-    for object_id, count in object_id_counts.items():
-        if count == num_lists:
-            for lst in lists:
-                for record in lst:
-                    if record.object_id == object_id:
-                        intersection_dict[object_id].append(record)
-
-    return dict(intersection_dict)
+    """object_ids present in all the lists (see results_at_least)."""
+    return results_at_least(len(lists), *lists)
+
+
+def results_union(
+    *lists: list[ReverseLookupRecord],
+) -> dict[str, list[ReverseLookupRecord]]:
+    """object_ids present in any of the lists (see results_at_least)."""
+    return results_at_least(1, *lists)
+
+
+def results_overlap(
+    *lists: list[ReverseLookupRecord], measure: str = "count"
+) -> np.ndarray:
+    """Pairwise overlap of the object_ids of the lists.
+
+    Args:
+        *lists (list[ReverseLookupRecord]): results of the studies
+        measure (str, optional): "count" (shared object_ids) or "jaccard". Defaults to "count".
+
+    Raises:
+        ValueError: if measure is unknown
+
+    Returns:
+        np.ndarray: (lists x lists) overlap matrix, the diagonal is the size of each list
+    """
+    if measure not in ("count", "jaccard"):
+        raise ValueError(f"{measure} not in available overlap measures")
+    _, present_in = _group_by_object_id(lists)
+    # (object_ids x lists) presence matrix
+    presence = np.zeros((len(present_in), len(lists)), dtype=np.int64)
+    for row, list_indices in enumerate(present_in.values()):
+        presence[row, list(list_indices)] = 1
+    overlap = presence.T @ presence
+    if measure == "count":
+        return overlap
+    sizes = np.diag(overlap)
+    union = sizes[:, None] + sizes[None, :] - overlap
+    return np.divide(overlap, union, out=np.zeros(overlap.shape), where=union > 0)
@@ -0,0 +1,173 @@
+"""Stateful reverse lookup study of a studyset which is edited one term at a time.
+
+StudySession keeps the study_count of every product. Adding or removing terms only visits the
+products annotated to those terms (columns of the reverse lookup index), and p-values are only
+recalculated for products whose counts changed. Since study_n is a parameter of every p-value,
+an edit which changes the size of the studyset changes all of them; these are recalculated in one
+batch through the PvalueCache of the study, where most (study_count, study_n, pop_count) tables
+repeat.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import numpy as np
+
+from .multiple_testing import multiple_correction
+from .reverse_lookup import ReverseLookupRecord
+
+if TYPE_CHECKING:
+    from .index import ReverseLookupIndex
+    from .population import Population
+    from .reverse_lookup import GOReverseLookupStudy
+
+
+class StudySession:
+    """Incrementally edited studyset of a GOReverseLookupStudy.
+
+    Example:
+        >>> session = StudySession(study, ["GO:0000002"])
+        >>> session.add("GO:0005829")
+        >>> results = session.results()  # same as study.run_study(session.studyset)
+    """
+
+    def __init__(self, study: GOReverseLookupStudy, studyset: Iterable[str] = ()):
+        """
+        Raises:
+            ValueError: if the study uses the elim, weight or parent_child algorithm, whose counts
+                can not be updated term by term
+        """
+        self.study = study
+        self.studyset: set[str] = set()
+        self._reset()
+        self.edit(add=studyset)
+
+    def _reset(self) -> None:
+        """Start over with the current index and population of the study."""
+        if self.study.algorithm != "classic":
+            raise ValueError("sessions only support the classic algorithm")
+        self._index: ReverseLookupIndex = self.study.index
+        self._population: Population = self.study._population()
+        n_products = len(self._index.object_ids)
+        # counts of all products at once from the packed bitsets of the index
+        self.study_counts = self._index.study_counts(
+            self._population.filter(self.studyset)
+        )
+        self._pvals = np.full(n_products, np.nan)  # NaN for products not in study
+        self._dirty = self.study_counts > 0
+        self._pval_params: Optional[tuple] = None  # (study_n, method) of _pvals
+
+    @property
+    def study_n(self) -> int:
+        """number of studyset terms in the population"""
+        return len(self._population.filter(self.studyset))
+
+    def _stale(self) -> bool:
+        """annotations (index) or population of the study changed"""
+        study = self.study
+        return (
+            study.algorithm != "classic"
+            or study.index is not self._index
+            or study._population() is not self._population
+        )
+
+    def add(self, *terms: str) -> None:
+        """Add terms to the studyset."""
+        self.edit(add=terms)
+
+    def remove(self, *terms: str) -> None:
+        """Remove terms from the studyset."""
+        self.edit(remove=terms)
+
+    def edit(self, add: Iterable[str] = (), remove: Iterable[str] = ()) -> None:
+        """Add and remove terms in one edit (if the size of the studyset is unchanged, only the
+        p-values of the affected products are recalculated).
+        """
+        if self._stale():
+            self._reset()
+        new_studyset = (self.studyset | set(add)) - set(remove)
+        self._apply(new_studyset - self.studyset, 1)
+        self._apply(self.studyset - new_studyset, -1)
+        self.studyset = new_studyset
+
+    def _apply(self, terms: Iterable[str], delta: int) -> None:
+        """Update study_count of the products annotated to terms."""
+        csc = self._index.matrix_csc
+        cols = self._index.term_columns(self._population.filter(terms))
+        if not len(cols):
+            return
+        rows = np.concatenate(
+            [csc.indices[csc.indptr[col] : csc.indptr[col + 1]] for col in cols]
+        )
+        np.add.at(self.study_counts, rows, delta)
+        self._dirty[rows] = True
+
+    def _update_pvals(self) -> None:
+        study = self.study
+        if self._stale():
+            self._reset()
+        params = (self.study_n, study.pval_method)
+        if params == self._pval_params:
+            rows = np.flatnonzero(self._dirty)
+        else:
+            rows = np.flatnonzero(self._dirty | (self.study_counts > 0))
+        rows = rows[self.study_counts[rows] > 0]
+        self._pvals[self._dirty & (self.study_counts == 0)] = np.nan
+        self._pvals[rows] = study.pval_cache.pvalue_calculate_batch(
+            self.study_counts[rows],
+            self.study_n,
+            self._population.pop_counts[rows],
+            self._population.pop_n,
+            study.pval_method,
+            table=study._logfactorial_table(self._population.pop_n),
+        )
+        self._dirty[:] = False
+        self._pval_params = params
+
+    def results(self, **kws) -> list[ReverseLookupRecord]:
+        """Results of the current studyset, as GOReverseLookupStudy.run_study.
+
+        Args:
+            **kws: methods, alpha and keep_if as in GOReverseLookupStudy.run_study
+
+        Returns:
+            list[ReverseLookupRecord]: results
+        """
+        if not self.studyset:
+            return []
+        methods = kws.get("methods", self.study.methods)
+        alpha = kws.get("alpha", self.study.alpha)
+
+        self._update_pvals()
+        rows = np.flatnonzero(self.study_counts > 0)
+        uncorrected = self._pvals[rows]
+        corrected = {
+            method: multiple_correction(uncorrected, method, alpha)
+            for method in methods
+        }
+        index = self._index
+        pop_n = self._population.pop_n
+        study_n = self.study_n
+        study_terms = set(self._population.filter(self.studyset))
+        results = []
+        for i, row in enumerate(rows.tolist()):
+            pvals = {"uncorrected": float(uncorrected[i])}
+            pvals.update((method, float(corrected[method][i])) for method in methods)
+            population_items = index.population_items(row)
+            results.append(
+                ReverseLookupRecord(
+                    index.object_ids[row],
+                    pvals=pvals,
+                    study_items=set(population_items & study_terms),
+                    population_items=population_items,
+                    ratio_in_study=(int(self.study_counts[row]), study_n),
+                    ratio_in_pop=(int(self._population.pop_counts[row]), pop_n),
+                )
+            )
+
+        if "keep_if" in kws:
+            keep_if = kws["keep_if"]
+            results = [r for r in results if keep_if(r)]
+
+        return results
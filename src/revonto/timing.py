@@ -0,0 +1,168 @@
+"""Timing of the major stages (loading, propagation, g:Profiler lookups and studies).
+
+Instrumented functions report a Span (stage name, wall time and item counts) to every registered
+hook when they return. Without hooks they are called directly, so instrumentation costs a single
+check per call.
+
+Example:
+    >>> from revonto import timing
+    >>> timing.log_spans()  # log to the "revonto.timing" logger
+    >>> with timing.collect() as spans:  # or collect spans of a block
+    ...     study.run_study(studyset)
+    >>> spans[0].name, spans[0].seconds, spans[0].items
+    ('run_study', 0.012, {'studyset': 40, 'results': 200})
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from . import memory
+
+logger = logging.getLogger("revonto.timing")
+
+# registered hooks, replaced (never mutated) so instrumented calls read them without a lock
+_hooks: tuple[Callable[[Span], None], ...] = ()
+
+
+class Span:
+    """One timed call of an instrumented stage."""
+
+    def __init__(
+        self,
+        name: str,
+        seconds: float,
+        items: dict[str, int],
+        peak_bytes: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self.seconds = seconds
+        self.items = items  # e.g. {"terms": 47000}
+        # peak traced memory of the call, only inside revonto.memory.track_peaks
+        self.peak_bytes = peak_bytes
+
+    def __repr__(self) -> str:
+        items = ", ".join(f"{key}={value}" for key, value in self.items.items())
+        peak = "" if self.peak_bytes is None else f", peak={self.peak_bytes}B"
+        return f"Span({self.name}, {self.seconds:.6f}s, {items}{peak})"
+
+
+def add_hook(hook: Callable[[Span], None]) -> None:
+    """Call hook with the Span of every instrumented call."""
+    global _hooks
+    _hooks = _hooks + (hook,)
+
+
+def remove_hook(hook: Callable[[Span], None]) -> None:
+    global _hooks
+    _hooks = tuple(h for h in _hooks if h is not hook)
+
+
+def log_spans(level: int = logging.INFO) -> Callable[[Span], None]:
+    """Log every span to the "revonto.timing" logger (returns the hook, for remove_hook)."""
+
+    def hook(span: Span) -> None:
+        logger.log(level, "%r", span)
+
+    add_hook(hook)
+    return hook
+
+
+@contextmanager
+def collect() -> Iterator[list[Span]]:
+    """Collect the spans of the calls made inside the with block (from any thread)."""
+    spans: list[Span] = []
+    hook = spans.append
+    add_hook(hook)
+    try:
+        yield spans
+    finally:
+        remove_hook(hook)
+
+
+def timed(
+    name: str, items: Optional[Callable[..., dict[str, int]]] = None
+) -> Callable[[Callable], Callable]:
+    """Decorator reporting calls of a stage (function or coroutine function) to the hooks.
+
+    Args:
+        name (str): stage name
+        items (Callable[..., dict[str, int]], optional): called with the result and the arguments
+            of the call, returns the item counts of the span. Defaults to None.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                if not _hooks:
+                    return await func(*args, **kwargs)
+                tracing = _start_peak()
+                start = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except BaseException:
+                    _abort_peak(tracing)
+                    raise
+                _report(name, start, tracing, items, result, args, kwargs)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            if not _hooks:
+                return func(*args, **kwargs)
+            tracing = _start_peak()
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                _abort_peak(tracing)
+                raise
+            _report(name, start, tracing, items, result, args, kwargs)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _start_peak() -> bool:
+    """start measuring the peak memory of a call, if revonto.memory.track_peaks is active"""
+    if not memory._span_peaks:
+        return False
+    memory._span_start()
+    return True
+
+
+def _abort_peak(tracing: bool) -> None:
+    """end the peak measurement of a call which raised"""
+    if tracing:
+        memory._span_end()
+
+
+def _report(
+    name: str,
+    start: float,
+    tracing: bool,
+    items: Optional[Callable[..., dict[str, int]]],
+    result: Any,
+    args: tuple,
+    kwargs: dict,
+) -> None:
+    seconds = time.perf_counter() - start
+    span = Span(
+        name,
+        seconds,
+        items(result, *args, **kwargs) if items is not None else {},
+        memory._span_end() if tracing else None,
+    )
+    for hook in _hooks:
+        hook(span)
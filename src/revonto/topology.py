@@ -0,0 +1,197 @@
+"""Topology-aware counting of study terms (elim, weight and parent-child).
+
+The classic test counts every studyset term annotated to a product. With propagated annotations a
+product annotated to a term is also annotated to all its ancestors, so a studyset holding a term and
+its ancestors counts the same evidence several times. The algorithms below, modeled on topGO's elim
+and weight and on the parent-child union test, change the counts of each product before its p-value
+is calculated:
+
+- elim: going from the leaves of the DAG to the root, every counted study term removes its ancestors
+  from the study and population terms of the product. A study term therefore only counts if no study
+  term below it is annotated to the product.
+- weight: instead of removing them, a study term with k annotated study terms below it counts
+  1 / (1 + k). The hypergeometric test needs integer counts, so study_count is the sum of the
+  weights rounded down: never above the classic count and at least the elim count, since every
+  term counted by elim has weight 1. Fractions are lost, e.g. 1 + 1/2 counts as 1 like elim.
+- parent_child: a term is only part of the population of a product if it is a root or one of its
+  parents is annotated to the product, so study_n and pop_n are different for each product.
+
+Processing levels from leaves to root only needs to know which study terms are below which, so the
+descendant closures cached on GODag replace the level by level walk, and all products are counted
+at once with sparse matrix products.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+
+    from .index import ReverseLookupIndex
+    from .ontology import GODag
+    from .population import Population
+
+algorithms = ["classic", "elim", "weight", "parent_child"]
+
+
+def below_counts(
+    godag: GODag,
+    study_terms: Sequence[str],
+    indptr: np.ndarray,
+    positions: np.ndarray,
+) -> np.ndarray:
+    """Number of study terms annotated to the same product below each study item.
+
+    Args:
+        godag (GODag): ontology
+        study_terms (Sequence[str]): terms of the studyset
+        indptr (np.ndarray): study items of product i are positions[indptr[i]:indptr[i + 1]]
+        positions (np.ndarray): study items as positions in study_terms
+
+    Returns:
+        np.ndarray: for each study item, its annotated study terms which are strict descendants
+    """
+    from scipy.sparse import csr_matrix
+
+    n_products, n_terms = len(indptr) - 1, len(study_terms)
+    if not len(positions):
+        return np.zeros(0, dtype=np.int64)
+    study_index = {term_id: i for i, term_id in enumerate(study_terms)}
+    # below[i, j] = 1 if study term j is a strict descendant of study term i
+    below_rows, below_cols = [], []
+    for i, term_id in enumerate(study_terms):
+        if term_id not in godag:
+            continue
+        for descendant in godag.descendants(term_id).intersection(study_index):
+            below_rows.append(i)
+            below_cols.append(study_index[descendant])
+    below = csr_matrix(
+        (np.ones(len(below_rows), dtype=np.int64), (below_rows, below_cols)),
+        shape=(n_terms, n_terms),
+    )
+    items = csr_matrix(
+        (np.ones(len(positions), dtype=np.int64), positions, indptr),
+        shape=(n_products, n_terms),
+    )
+    counts = (items @ below.T).tocsr()
+    item_rows = np.repeat(np.arange(n_products), np.diff(indptr))
+    return np.asarray(counts[item_rows, positions]).reshape(-1)
+
+
+class ParentChildTerms:
+    """Population terms and their parents as sparse matrices over the columns of an index."""
+
+    def __init__(
+        self, godag: GODag, index: ReverseLookupIndex, population: Population
+    ) -> None:
+        from scipy.sparse import csr_matrix
+
+        term_ids = (
+            list(godag) if population.term_ids is None else sorted(population.term_ids)
+        )
+        self.position = {term_id: j for j, term_id in enumerate(term_ids)}
+        self.is_root = np.array(
+            [not godag[term_id].parents for term_id in term_ids], dtype=bool
+        )
+        shape = (len(index.term_ids), len(term_ids))
+        # parents[col, j] = 1 if the term of index column col is a parent of term_ids[j]
+        parent_cols, parent_positions = [], []
+        for j, term_id in enumerate(term_ids):
+            for parent in godag[term_id].parents:
+                col = index.term_index.get(parent.term_id)
+                if col is not None:
+                    parent_cols.append(col)
+                    parent_positions.append(j)
+        self.parents: csr_matrix = csr_matrix(
+            (
+                np.ones(len(parent_cols), dtype=np.int64),
+                (parent_cols, parent_positions),
+            ),
+            shape=shape,
+        )
+        # members[col, j] = 1 if index column col is term_ids[j]
+        member_cols = index.term_columns(term_ids)
+        self.members: csr_matrix = csr_matrix(
+            (
+                np.ones(len(member_cols), dtype=np.int64),
+                (member_cols, [self.position[index.term_ids[c]] for c in member_cols]),
+            ),
+            shape=shape,
+        )
+
+    def counts(
+        self,
+        index: ReverseLookupIndex,
+        rows: np.ndarray,
+        study_terms: Sequence[str],
+        indptr: np.ndarray,
+        cols: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Parent-child union counts of products.
+
+        Args:
+            index (ReverseLookupIndex): index the matrices were built for
+            rows (np.ndarray): products (index rows)
+            study_terms (Sequence[str]): terms of the studyset
+            indptr (np.ndarray): study items of product i are cols[indptr[i]:indptr[i + 1]]
+            cols (np.ndarray): study items as index columns
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: kept (mask of study items whose
+                parent is annotated to the product, or which are roots), study_n, pop_count and pop_n
+                of each product
+        """
+        products = index.matrix[rows]
+        # candidates: population terms with at least one parent annotated to the product
+        candidates = (products @ self.parents).tocsr()
+        candidates.data = (candidates.data > 0).astype(np.int64)
+        candidates.eliminate_zeros()
+        n_roots = int(self.is_root.sum())
+        pop_n = n_roots + np.asarray(candidates.sum(axis=1)).reshape(-1)
+
+        annotated = (products @ self.members).tocsr()
+        pop_count = np.asarray(annotated.multiply(candidates).sum(axis=1)).reshape(-1)
+        pop_count += np.asarray(annotated[:, self.is_root].sum(axis=1)).reshape(-1)
+
+        study_positions = np.array(
+            [self.position[t] for t in study_terms if t in self.position],
+            dtype=np.int64,
+        )
+        study_roots = study_positions[self.is_root[study_positions]]
+        study_n = len(study_roots) + np.asarray(
+            candidates[:, study_positions].sum(axis=1)
+        ).reshape(-1)
+
+        item_positions = np.array(
+            [self.position.get(index.term_ids[c], -1) for c in cols.tolist()],
+            dtype=np.int64,
+        )
+        item_rows = np.repeat(np.arange(len(rows)), np.diff(indptr))
+        known = item_positions >= 0
+        kept = np.zeros(len(cols), dtype=bool)
+        kept[known] = self.is_root[item_positions[known]] | (
+            np.asarray(candidates[item_rows[known], item_positions[known]]).reshape(-1)
+            > 0
+        )
+        return kept, study_n, pop_count, pop_n
+
+
+def keep_items(
+    indptr: np.ndarray, cols: np.ndarray, kept: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """CSR study items without the ones which are not kept."""
+    item_rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    new_indptr = np.zeros(len(indptr), dtype=np.int64)
+    np.cumsum(
+        np.bincount(item_rows[kept], minlength=len(indptr) - 1), out=new_indptr[1:]
+    )
+    return new_indptr, cols[kept]
+
+
+def check_algorithm(algorithm: str) -> str:
+    if algorithm not in algorithms:
+        raise ValueError(f"{algorithm} not in available algorithms {algorithms}")
+    return algorithm
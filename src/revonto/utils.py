@@ -1,4 +1,23 @@
-import requests
+import asyncio
+from typing import Iterable, Union
+
+GPROFILER_ORGANISMS_URL = "https://biit.cs.ut.ee/gprofiler/api/util/organisms_list"
+
+
+def _taxon_equivalents(results: list[dict]) -> dict[str, str]:
+    taxon_equivalents = {}
+    for r in results:
+        taxon_equivalents[r["taxonomy_id"]] = r["id"]
+    return taxon_equivalents
+
+
+def ids_list(ids: Union[str, Iterable[str]]) -> list[str]:
+    """A single id or a collection of ids as a list."""
+    if isinstance(ids, str):
+        return [ids]
+    if isinstance(ids, list):
+        return ids
+    return list(ids)
 
 
 def NCBITaxon_to_gProfiler(taxon):
@@ -10,9 +29,33 @@ def NCBITaxon_to_gProfiler(taxon):
     Returns:
         _type_: _description_
     """
-    r = requests.get("https://biit.cs.ut.ee/gprofiler/api/util/organisms_list")
-    taxon_equivalents = {}
-    results = r.json()
-    for r in results:
-        taxon_equivalents[r["taxonomy_id"]] = r["id"]
-    return taxon_equivalents.get(str(taxon), None)
+    import requests  # slow to import, only needed for network calls
+
+    r = requests.get(GPROFILER_ORGANISMS_URL)
+    return _taxon_equivalents(r.json()).get(str(taxon), None)
+
+
+async def NCBITaxon_to_gProfiler_async(taxon):
+    """Awaitable NCBITaxon_to_gProfiler."""
+    results = await request_json_async("GET", GPROFILER_ORGANISMS_URL)
+    return _taxon_equivalents(results).get(str(taxon), None)
+
+
+async def request_json_async(method: str, url: str, json=None):
+    """HTTP request without blocking the event loop, returns the decoded JSON response.
+
+    Uses aiohttp if it is installed (pip install revonto[async]), otherwise runs requests in a thread.
+    """
+    try:
+        import aiohttp
+    except ImportError:
+        import requests  # slow to import, only needed for network calls
+
+        def request():
+            return requests.request(method, url, json=json).json()
+
+        return await asyncio.to_thread(request)
+
+    async with aiohttp.ClientSession() as session:
+        async with session.request(method, url, json=json) as response:
+            return await response.json(content_type=None)
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 from revonto.associations import Annotation, Annotations
@@ -261,3 +263,78 @@ def test_convert_ids_gConvert():
             "ZFIN:ZDB-GENE-170217-1",
         ]
     )
+
+
+def test_find_orthologs_bulk(monkeypatch):
+    monkeypatch.setattr(
+        "revonto.associations._find_orthologs",
+        lambda ids, src_taxon, target_taxon, database: {
+            "A": ["ENSG1", "ENSG2"],
+            "B": [],
+        },
+    )
+    annoset = Annotations(
+        [
+            Annotation(object_id="DB:A", term_id="GO:1234", taxon="7955"),
+            Annotation(object_id="DB:A", term_id="GO:5678", taxon="7955"),
+            Annotation(object_id="DB:B", term_id="GO:5678", taxon="7955"),
+        ]
+    )
+
+    annoset.find_orthologs(taxon="9606", prune=True)
+
+    assert len(annoset) == 4
+    assert all(a.taxon == "9606" for a in annoset)
+    assert all(a.provenance == ("ortholog",) for a in annoset)
+    assert Annotation(object_id="ENSG2", term_id="GO:5678", taxon="9606") in annoset
+
+
+def test_convert_ids_bulk(monkeypatch):
+    monkeypatch.setattr(
+        "revonto.associations._convert_ids",
+        lambda ids, taxon, namespace, database: {"A": ["ENSG1"], "B": []},
+    )
+    annoset = Annotations(
+        [
+            Annotation(object_id="DB:A", term_id="GO:1234", taxon="9606"),
+            Annotation(object_id="DB:B", term_id="GO:1234", taxon="9606"),
+        ]
+    )
+
+    annoset.convert_ids()
+
+    assert set(a.object_id for a in annoset) == {"ENSG1", "DB:B"}
+    assert next(a for a in annoset if a.object_id == "ENSG1").provenance == (
+        "convert_ids",
+    )
+    assert next(a for a in annoset if a.object_id == "DB:B").provenance == ()
+
+
+def test_find_orthologs_and_convert_ids_async(monkeypatch):
+    async def find_orthologs(ids, src_taxon, target_taxon, database):
+        return {"A": ["ENSG1"], "B": []} if src_taxon == "7955" else {"C": ["ENSG3"]}
+
+    async def convert_ids(ids, taxon, namespace, database):
+        return {"A": ["ENSG1"]}
+
+    monkeypatch.setattr("revonto.associations._find_orthologs_async", find_orthologs)
+    monkeypatch.setattr("revonto.associations._convert_ids_async", convert_ids)
+    annoset = Annotations(
+        [
+            Annotation(object_id="DB:A", term_id="GO:1234", taxon="7955"),
+            Annotation(object_id="DB:B", term_id="GO:1234", taxon="7955"),
+            Annotation(object_id="DB:C", term_id="GO:5678", taxon="10090"),
+        ]
+    )
+
+    asyncio.run(annoset.find_orthologs_async(taxon="9606", prune=True))
+    assert {a.object_id for a in annoset} == {"ENSG1", "ENSG3"}
+
+    annoset = Annotations(
+        [
+            Annotation(object_id="DB:A", term_id="GO:1234", taxon="9606"),
+            Annotation(object_id="DB:B", term_id="GO:1234", taxon="9606"),
+        ]
+    )
+    asyncio.run(annoset.convert_ids_async())
+    assert {a.object_id for a in annoset} == {"ENSG1", "DB:B"}
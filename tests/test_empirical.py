@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from revonto.empirical import build_strata, empirical_pvalues
+from revonto.index import ReverseLookupIndex
+from revonto.reverse_lookup import GOReverseLookupStudy
+
+
+def test_build_strata(godag_test):
+    strata = build_strata(godag_test, ["GO:0000002", "GO:0000006"], "namespace")
+    assert sorted(n for _, n in strata) == [1, 1]
+    with pytest.raises(ValueError):
+        build_strata(godag_test, ["GO:0000002"], "height")
+    with pytest.raises(ValueError):
+        build_strata(godag_test, ["GO:9999999"], "depth")
+
+
+def test_empirical_pvalues_early_stopping(annotations_test, godag_test):
+    matrix = ReverseLookupIndex.from_annotations(annotations_test).matrix_for_terms(
+        list(godag_test)
+    )
+    strata = build_strata(godag_test, ["GO:0000002", "GO:0005829"])
+    observed = np.zeros(matrix.shape[0], dtype=int)  # every random studyset exceeds
+    pvals, n_drawn = empirical_pvalues(
+        matrix, strata, observed, n_permutations=1000, chunk_size=100, seed=0
+    )
+    assert np.all(pvals == 1)
+    assert np.all(n_drawn == 100)
+
+    _, n_drawn = empirical_pvalues(
+        matrix, strata, observed, n_permutations=1000, chunk_size=100, precision=None
+    )
+    assert np.all(n_drawn == 1000)
+
+
+def test_run_study_empirical(annotations_test, godag_test):
+    study = GOReverseLookupStudy(annotations_test, godag_test)
+    studyset = ["GO:0000002", "GO:0005829"]
+    serial = study.run_study_empirical(
+        studyset, n_permutations=600, chunk_size=100, seed=42
+    )
+    parallel = study.run_study_empirical(
+        studyset, n_permutations=600, chunk_size=100, seed=42, n_jobs=2
+    )
+
+    assert serial[0].object_id == "UniProtKB:A0A024RBG1"
+    assert pytest.approx(serial[0].pvals["fisher_scipy_stats"]) == 0.2
+    assert serial[0].pvals["uncorrected"] == parallel[0].pvals["uncorrected"]
+    # 2 of 6 terms in study, product annotated to both: P = 1 / C(6, 2)
+    assert serial[0].pvals["uncorrected"] == pytest.approx(1 / 15, abs=0.05)
+
+
+def test_run_study_empirical_topology_algorithm(annotations_test, godag_test):
+    study = GOReverseLookupStudy(annotations_test, godag_test, algorithm="elim")
+    with pytest.raises(ValueError):
+        study.run_study_empirical(["GO:0000002"], n_permutations=10)
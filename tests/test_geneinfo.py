@@ -1,6 +1,17 @@
-from revonto.geneinfo import gConvert
+import asyncio
+
+import pytest
+
+from revonto.geneinfo import convert_ids, convert_ids_async, gConvert
 
 
 def test_gConvert():
     results = gConvert(["ZDB-GENE-021119-1"], "drerio", "ensg")
     assert len(results["ZDB-GENE-021119-1"]) == 2
+
+
+def test_convert_ids_unknown_database():
+    with pytest.raises(ValueError):
+        convert_ids("ZDB-GENE-021119-1", "7955", database="unknown")
+    with pytest.raises(ValueError):
+        asyncio.run(convert_ids_async("ZDB-GENE-021119-1", "7955", database="unknown"))
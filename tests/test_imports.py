@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "module",
+    ["revonto.reverse_lookup", "revonto.associations", "revonto.multiple_testing"],
+)
+def test_heavy_dependencies_are_lazy(module):
+    """scipy, statsmodels and requests are only imported when first needed"""
+    code = (
+        f"import sys, {module}; "
+        "print(','.join(m for m in ('scipy', 'statsmodels', 'requests') if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == ""
@@ -0,0 +1,63 @@
+import numpy as np
+
+from revonto import bitsets
+from revonto.associations import Annotation, Annotations
+from revonto.index import ReverseLookupIndex
+
+
+def test_reverse_lookup_index():
+    anno = Annotations(
+        [
+            Annotation(object_id="ABC1", term_id="GO:1234", taxon="9606"),
+            Annotation(object_id="ABC1", term_id="GO:1234", taxon="10090"),
+            Annotation(object_id="ABC1", term_id="GO:5678"),
+            Annotation(object_id="ABC2", term_id="GO:5678"),
+        ]
+    )
+    index = ReverseLookupIndex.from_annotations(anno)
+
+    abc1 = index.object_index["ABC1"]
+    assert index.pop_counts[abc1] == 2  # same term in two taxons counts once
+    assert index.population_items(abc1) == {"GO:1234", "GO:5678"}
+
+    rows, study_items = index.study_items(["GO:5678", "GO:0000"])
+    assert [index.object_ids[row] for row in rows] == sorted(
+        ["ABC1", "ABC2"], key=index.object_index.get
+    )
+    assert study_items == [{"GO:5678"}, {"GO:5678"}]
+    assert index.study_items(["GO:0000"])[1] == []
+
+    matrix = index.matrix_for_terms(["GO:0000", "GO:5678"])
+    assert matrix.shape == (2, 2)
+    assert np.all(matrix.toarray()[:, 0] == 0)
+    assert np.all(matrix.toarray()[:, 1] == 1)
+
+    counts, study_n = index.study_counts_matrix(
+        [["GO:5678", "GO:0000"], ["GO:1234", "GO:5678"], []]
+    )
+    assert counts.shape == (2, 3)
+    assert list(study_n) == [2, 2, 0]
+    assert counts[abc1].toarray().tolist() == [[1, 2, 0]]
+
+
+def test_packed_study_counts():
+    rng = np.random.default_rng(0)
+    anno = Annotations(
+        Annotation(object_id=f"P{p}", term_id=f"GO:{t:07}")
+        for p in range(50)
+        for t in rng.choice(200, rng.integers(1, 80), replace=False)
+    )
+    index = ReverseLookupIndex.from_annotations(anno)
+    studyset = [f"GO:{t:07}" for t in rng.choice(220, 70, replace=False)]
+
+    expected = np.asarray(index.matrix_for_terms(studyset).sum(axis=1)).reshape(-1)
+    assert index.packed.shape == (50, 4)
+    assert np.array_equal(index.study_counts(studyset), expected)
+    assert np.array_equal(index.study_counts([]), np.zeros(50))
+
+
+def test_popcount_fallback(monkeypatch):
+    words = np.array([0, 1, 2**64 - 1, 0x8000000000000001], dtype=np.uint64)
+    assert bitsets.popcount(words).tolist() == [0, 1, 64, 2]
+    monkeypatch.delattr(np, "bitwise_count", raising=False)
+    assert bitsets.popcount(words).tolist() == [0, 1, 64, 2]
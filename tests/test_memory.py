@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+from revonto import timing
+from revonto.associations import Annotations
+from revonto.memory import deep_sizeof, footprint, track_peaks
+from revonto.ontology import GODag
+from revonto.pvalcalc import PvalueCache
+from revonto.reverse_lookup import GOReverseLookupStudy
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def test_deep_sizeof():
+    shared = "x" * 1000
+    assert deep_sizeof([shared, shared]) < 2 * len(shared)  # counted once
+    array = np.zeros(1000)
+    assert deep_sizeof(array[:10]) > array.nbytes  # a view keeps its base alive
+
+
+def test_footprint(annotations_test, godag_test):
+    godag_report = footprint(godag_test)
+    assert set(godag_report) == {"dict", "terms", "strings", "closures", "total"}
+    assert godag_report["closures"] < 1000
+    godag_test.descendants("GO:0000001")
+    assert footprint(godag_test)["closures"] > godag_report["closures"]
+
+    anno_report = footprint(annotations_test)
+    assert set(anno_report) == {"set", "annotations", "strings", "metadata", "total"}
+    assert anno_report["strings"] > 0
+    assert anno_report["total"] >= sum(
+        size for key, size in anno_report.items() if key != "total"
+    )
+
+    study = GOReverseLookupStudy(annotations_test, godag_test, pval_cache=PvalueCache())
+    before = footprint(study)
+    study.run_study(["GO:0000002", "GO:0005829"])
+    after = footprint(study)
+    assert after["index"] > before["index"]  # built by run_study
+    assert after["pval_cache"] > before["pval_cache"]
+    assert set(after) == {
+        "index",
+        "populations",
+        "pval_cache",
+        "result_cache",
+        "logfactorial_table",
+        "total",
+    }
+
+
+def test_track_peaks():
+    with track_peaks() as tracker, timing.collect() as spans:
+        GODag.from_file(os.path.join(DATA, "go1.obo"))
+        Annotations.from_file(os.path.join(DATA, "human_test.gaf"))
+        big = np.ones(1_000_000)
+        del big
+    assert tracker.peak >= 8_000_000
+    assert [span.name for span in spans] == ["GODag.from_file", "Annotations.from_file"]
+    assert all(0 < span.peak_bytes < 8_000_000 for span in spans)
+
+    with timing.collect() as spans:
+        GODag.from_file(os.path.join(DATA, "go1.obo"))
+    assert spans[0].peak_bytes is None  # not tracing
+
+
+def test_track_peaks_memory_held_across_spans(annotations_test, godag_test):
+    study = GOReverseLookupStudy(annotations_test, godag_test)
+    with track_peaks(), timing.collect() as spans:
+        study.run_study(["GO:0000002", "GO:0005829"])
+        held = bytearray(20_000_000)
+        study.run_study(["GO:0000002", "GO:0005829"])
+        del held
+    peaks = [span.peak_bytes for span in spans if span.name == "run_study"]
+    assert len(peaks) == 2
+    assert all(0 < peak < 5_000_000 for peak in peaks)
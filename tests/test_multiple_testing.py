@@ -1,6 +1,8 @@
+import numpy as np
 import pytest
+from statsmodels.stats.multitest import multipletests
 
-from revonto.multiple_testing import multiple_correction
+from revonto.multiple_testing import multiple_correction, uncorrected_threshold
 
 
 @pytest.fixture
@@ -12,6 +14,10 @@ def test_pvals():
     "method",
     [
         "bonferroni",
+        "holm",
+        "sidak",
+        "fdr_bh",
+        "fdr_by",
         "sm_bonferroni",
         "sm_sidak",
         "sm_holm-sidak",
@@ -29,10 +35,67 @@ def test_available_multiple_correction(test_pvals, method):
     assert len(corrected_pvals) == 5
 
 
+@pytest.mark.parametrize("method", ["bonferroni", "holm", "sidak", "fdr_bh", "fdr_by"])
+def test_native_equals_statsmodels(method):
+    pvals = np.random.default_rng(0).uniform(0, 0.2, size=50)
+    pvals[[3, 7]] = pvals[5]  # ties
+    assert np.allclose(
+        multiple_correction(pvals, method),
+        multipletests(pvals, 0.05, method)[1],
+    )
+    assert np.allclose(
+        multiple_correction(pvals, method), multiple_correction(pvals, "sm_" + method)
+    )
+
+
+@pytest.mark.parametrize("method", ["bonferroni", "holm", "fdr_bh", "sm_fdr_bh"])
+def test_multiple_correction_2d(method):
+    pvals = np.random.default_rng(1).uniform(0, 0.2, size=(20, 3))
+    corrected = multiple_correction(pvals, method)  # each column is one study
+    assert corrected.shape == pvals.shape
+    for column in range(pvals.shape[1]):
+        assert np.allclose(
+            corrected[:, column], multiple_correction(pvals[:, column], method)
+        )
+    assert np.allclose(multiple_correction(pvals.T, method, axis=1), corrected.T)
+
+    pvals[3, 1] = np.nan  # missing test
+    global_family = multiple_correction(pvals, method, axis=None)
+    assert global_family.shape == pvals.shape
+    assert np.isnan(global_family[3, 1])
+    tested = ~np.isnan(pvals)
+    assert np.allclose(
+        global_family[tested], multiple_correction(pvals[tested], method)
+    )
+
+
 def test_exceptions_multiple_correction():
     for method in ["sm_notthere", "notin"]:
         with pytest.raises(ValueError):
             multiple_correction([1], method)
-    for method in ["holm", "sidak", "fdr_bh"]:
-        with pytest.raises(NotImplementedError):
-            multiple_correction([1], method)
+
+
+def test_uncorrected_threshold():
+    assert uncorrected_threshold("bonferroni", 0.05, 10) == 0.005
+    assert uncorrected_threshold("sm_fdr_bh", 0.05, 10) == 0.05
+    assert multiple_correction(
+        [uncorrected_threshold("sidak", 0.05, 10)] * 10, "sidak"
+    )[0] == pytest.approx(0.05)
+    with pytest.raises(ValueError):
+        uncorrected_threshold("sm_hommel", 0.05, 10)
+
+
+@pytest.mark.parametrize("method", ["bonferroni", "holm", "sidak", "fdr_bh", "fdr_by"])
+def test_multiple_correction_missing_tests(method):
+    pvals = np.random.default_rng(2).uniform(0, 0.2, size=(10, 2))
+    pvals[[1, 4, 5], 0] = np.nan  # first study has only 7 tests
+    corrected = multiple_correction(pvals, method)
+    assert np.all(np.isnan(corrected[[1, 4, 5], 0]))
+    tested = ~np.isnan(pvals[:, 0])
+    assert np.allclose(
+        corrected[tested, 0], multiple_correction(pvals[tested, 0], method)
+    )
+    assert np.allclose(
+        multiple_correction(pvals, "sm_" + method)[tested, 0], corrected[tested, 0]
+    )
+    assert np.allclose(corrected[:, 1], multiple_correction(pvals[:, 1], method))
@@ -45,3 +45,33 @@ def test_get_all_parents(godag_test: GODag):
 def test_get_all_children(godag_test: GODag):
     entry = godag_test["GO:0000002"]
     assert entry.get_all_children() == {"GO:0000006", "GO:0000015"}
+
+
+def test_descendants(godag_test: GODag):
+    for term_id, term in godag_test.items():
+        assert godag_test.descendants(term_id) == term.get_all_children()
+    assert godag_test.descendants("GO:0000001") == {
+        "GO:0000002",
+        "GO:0000003",
+        "GO:0000006",
+        "GO:0000015",
+    }
+
+
+def test_expand(godag_test: GODag):
+    assert godag_test.expand(["GO:0000002", "GO:0000001", "GO:9999999"]) == {
+        "GO:0000001",
+        "GO:0000002",
+        "GO:0000003",
+        "GO:0000006",
+        "GO:0000015",
+        "GO:9999999",
+    }
+    assert godag_test.expand(["GO:0000001"], max_depth=1) == {
+        "GO:0000001",
+        "GO:0000002",
+        "GO:0000003",
+    }
+    assert godag_test.expand(["GO:0000001"], namespace="molecular_function") == {
+        "GO:0000006"
+    }
@@ -1,6 +1,8 @@
+import asyncio
+
 import pytest
 
-from revonto.ortholog import find_orthologs, gOrth
+from revonto.ortholog import find_orthologs, find_orthologs_async, gOrth
 
 
 def test_gOrth():
@@ -38,3 +40,15 @@ def test_multiple_same_incoming(db):
         ["ZDB-GENE-170217-1", "ZDB-GENE-170217-1"], "7955", "9606", database=db
     )
     assert len(result) == 1
+
+
+@pytest.mark.parametrize(
+    "database, error", [("unknown", ValueError), ("local_files", NotImplementedError)]
+)
+def test_find_orthologs_unavailable_database(database, error):
+    with pytest.raises(error):
+        find_orthologs("ZDB-GENE-170217-1", "7955", database=database)
+    with pytest.raises(error):
+        asyncio.run(
+            find_orthologs_async("ZDB-GENE-170217-1", "7955", database=database)
+        )
@@ -0,0 +1,37 @@
+import multiprocessing
+
+import pytest
+
+from revonto.parallel import ParallelReverseLookup
+from revonto.reverse_lookup import GOReverseLookupStudy
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_parallel_run_studies(annotations_test, godag_test, start_method):
+    if start_method not in multiprocessing.get_all_start_methods():
+        pytest.skip(f"{start_method} not available")
+    study = GOReverseLookupStudy(annotations_test, godag_test, methods=["fdr_bh"])
+    studysets = [
+        ["GO:0000002", "GO:0005829"],
+        ["GO:0005829"],
+        [],
+        ["GO:0000006", "GO:0005829", "GO:0000002"],
+    ]
+
+    with ParallelReverseLookup(
+        study,
+        n_jobs=2,
+        mp_context=multiprocessing.get_context(start_method),
+        chunk_size=1,
+    ) as parallel:
+        all_results = dict(
+            parallel.run_studies(studysets, keep_if=lambda r: r.study_count > 0)
+        )
+
+    assert sorted(all_results) == list(range(len(studysets)))
+    for i, studyset in enumerate(studysets):
+        expected = study.run_study(studyset)
+        assert [r.object_id for r in all_results[i]] == [r.object_id for r in expected]
+        for r, e in zip(all_results[i], expected):
+            assert r.pvals == pytest.approx(e.pvals)
+            assert r.study_items == e.study_items
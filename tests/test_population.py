@@ -0,0 +1,61 @@
+import pytest
+
+from revonto.index import ReverseLookupIndex
+from revonto.population import Population
+from revonto.pvalcalc import pvalue_calculate
+from revonto.reverse_lookup import GOReverseLookupStudy
+from revonto.session import StudySession
+
+
+def test_population_from_spec(annotations_test, godag_test):
+    index = ReverseLookupIndex.from_annotations(annotations_test)
+    row = index.object_index["UniProtKB:A0A024RBG1"]
+
+    everything = Population.from_spec("all", godag_test, index)
+    assert everything.term_ids is None
+    assert everything.pop_n == len(godag_test)
+    assert everything.pop_counts[row] == index.pop_counts[row]
+
+    annotated = Population.from_spec("annotated", godag_test, index)
+    assert annotated.term_ids == {"GO:0000002", "GO:0000015", "GO:0005829"}
+    assert annotated.pop_n == 3
+    assert annotated.pop_counts[row] == 2  # GO:0003723 is not in godag
+    assert annotated.filter(["GO:0003723", "GO:0000002"]) == ["GO:0000002"]
+
+    molecular_function = Population.from_spec("molecular_function", godag_test, index)
+    assert molecular_function.term_ids == {"GO:0000006", "GO:0005829"}
+    assert molecular_function.pop_counts[row] == 1
+
+    subset = Population.from_spec(["GO:0000002", "GO:9999999"], godag_test, index)
+    assert subset.term_ids == {"GO:0000002"}
+
+    with pytest.raises(ValueError):
+        Population.from_spec("not_a_namespace", godag_test, index)
+
+
+def test_study_population(annotations_test, godag_test):
+    studyset = ["GO:0000002", "GO:0005829", "GO:0003723"]
+    study = GOReverseLookupStudy(annotations_test, godag_test, population="annotated")
+    assert study._population() is study._population()  # resolved once
+    assert study.pop_n == 3
+
+    results = study.run_study(studyset)
+    record = next(r for r in results if r.object_id == "UniProtKB:A0A024RBG1")
+    assert (record.study_count, record.study_n, record.pop_count, record.pop_n) == (
+        2,
+        2,
+        2,
+        3,
+    )
+    assert pytest.approx(pvalue_calculate(2, 2, 2, 3, "fisher_scipy_stats")) == (
+        record.pvals["uncorrected"]
+    )
+
+    (batch,) = study.run_studies([studyset])
+    assert [r.pvals for r in batch] == [r.pvals for r in results]
+    session = StudySession(study, studyset)
+    assert [r.pvals for r in session.results()] == [r.pvals for r in results]
+
+    study.population = "all"
+    assert study.pop_n == len(godag_test)
+    assert session.results()[0].pop_n == len(godag_test)
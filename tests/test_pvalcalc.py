@@ -1,6 +1,15 @@
+import numpy as np
 import pytest
 
-from revonto.pvalcalc import pvalue_calculate
+from revonto.pvalcalc import (
+    LogFactorialTable,
+    PvalueCache,
+    fisher_lower_bound,
+    fisherscipystats_batch,
+    pvalue_calculate,
+    pvalue_calculate_batch,
+    shared_table,
+)
 
 
 def test_available_pvalue_calculate():
@@ -12,6 +21,10 @@ def test_available_pvalue_calculate():
         pytest.approx(pvalue_calculate(1, 2, 3, 40, "binomial_scipy_stats"))
         == 0.1443750
     )
+    assert (
+        pytest.approx(pvalue_calculate(1, 2, 3, 40, "fisher_logfactorial"))
+        == 0.1461538461538462
+    )
 
 
 def test_pvalue_calculate_exception():
@@ -26,3 +39,118 @@ def test_greater_alternative_fisher_scipy():
         print(pvalue)
         pvals.append(pvalue)
     assert all(pvals[i] < pvals[i - 1] for i in range(1, len(pvals)))
+
+
+@pytest.mark.parametrize(
+    "method", ["fisher_scipy_stats", "fisher_logfactorial", "binomial_scipy_stats"]
+)
+def test_pvalue_calculate_batch(method):
+    study_counts = [0, 1, 2, 5, 10, 20]
+    pop_counts = [100, 100, 50, 20, 10, 300]
+    pvals = pvalue_calculate_batch(study_counts, 20, pop_counts, 1000, method)
+    assert len(pvals) == len(study_counts)
+    for sc, pc, pval in zip(study_counts, pop_counts, pvals):
+        assert pytest.approx(pvalue_calculate(sc, 20, pc, 1000, method)) == pval
+
+
+@pytest.mark.parametrize(
+    "method", ["fisher_scipy_stats", "fisher_logfactorial", "binomial_scipy_stats"]
+)
+def test_pvalue_calculate_batch_study_n_array(method):
+    study_counts = [0, 1, 2, 5, 10]
+    study_ns = [5, 20, 10, 40, 10]
+    pop_counts = [100, 100, 50, 20, 10]
+    pvals = PvalueCache().pvalue_calculate_batch(
+        study_counts, study_ns, pop_counts, 1000, method
+    )
+    for sc, sn, pc, pval in zip(study_counts, study_ns, pop_counts, pvals):
+        assert pytest.approx(pvalue_calculate(sc, sn, pc, 1000, method)) == pval
+
+
+def test_pvalue_calculate_batch_exception():
+    with pytest.raises(ValueError):
+        pvalue_calculate_batch([1], 1, [1], 1, "notamethod")
+    with pytest.raises(ValueError):
+        pvalue_calculate_batch([1, 2], 2, [1], 4, "fisher_scipy_stats")
+
+
+def test_logfactorial_table_small_pvalues():
+    table = LogFactorialTable(100000)
+    # P(X >= 200) = C(300, 200) / C(100000, 200) underflows to 0 as a float
+    log_pval = table.log_hypergeom_sf([200], 200, [300], 100000)[0]
+    assert pytest.approx(log_pval) == (
+        table.log_binom(300, 200) - table.log_binom(100000, 200)
+    )
+    assert log_pval < -1000
+
+    with pytest.raises(ValueError):
+        table.log_hypergeom_sf([1], 2, [3], 100001)
+
+
+def test_logfactorial_blocks():
+    rng = np.random.default_rng(0)
+    pop_counts = rng.integers(1, 2000, 300)
+    study_counts = rng.integers(0, 200, 300) % (pop_counts + 1)
+    table = LogFactorialTable(5000)
+    one_block = table.log_hypergeom_sf(
+        study_counts, 400, pop_counts, 5000, max_tail_terms=10**9
+    )
+    blocked = table.log_hypergeom_sf(
+        study_counts, 400, pop_counts, 5000, max_tail_terms=1000
+    )
+    np.testing.assert_allclose(blocked, one_block, atol=1e-12)
+    np.testing.assert_allclose(
+        np.exp(blocked),
+        fisherscipystats_batch(study_counts, 400, pop_counts, 5000),
+        rtol=1e-8,
+        atol=1e-300,
+    )
+
+
+def test_shared_table():
+    table = shared_table(1000)
+    assert table.n >= 1000
+    assert shared_table(500) is table
+    assert shared_table(table.n + 1).n >= 2 * table.n
+    assert pvalue_calculate(2, 20, 50, 1000, "fisher_logfactorial") == pytest.approx(
+        pvalue_calculate(2, 20, 50, 1000, "fisher_scipy_stats")
+    )
+
+
+def test_pvalue_cache():
+    cache = PvalueCache(maxsize=3)
+    pvals = cache.pvalue_calculate_batch(
+        [1, 1, 2, 1], 20, [100, 100, 50, 100], 1000, "fisher_scipy_stats"
+    )
+    assert pvals[0] == pvals[1] == pvals[3]
+    assert pytest.approx(pvals[2]) == pvalue_calculate(
+        2, 20, 50, 1000, "fisher_scipy_stats"
+    )
+    assert cache.misses == 2
+    assert cache.hits == 2
+
+    # repeated study - everything is served from cache
+    cache.pvalue_calculate_batch([2, 1], 20, [50, 100], 1000, "fisher_scipy_stats")
+    assert cache.info()["hit_rate"] == 4 / 6
+
+    # method is part of the key
+    cache.pvalue_calculate(2, 20, 50, 1000, "binomial_scipy_stats")
+    assert cache.misses == 3
+
+    # bounded
+    cache.pvalue_calculate(3, 20, 50, 1000, "fisher_scipy_stats")
+    assert len(cache) == 3
+
+    assert len(cache.pvalue_calculate_batch([], 1, [], 1, "fisher_scipy_stats")) == 0
+
+
+def test_fisher_lower_bound():
+    study_counts = np.array([0, 1, 2, 5, 10, 20])
+    pop_counts = np.array([100, 100, 50, 20, 10, 300])
+    bounds = fisher_lower_bound(study_counts, 20, pop_counts, 1000)
+    pvals = pvalue_calculate_batch(
+        study_counts, 20, pop_counts, 1000, "fisher_scipy_stats"
+    )
+    assert np.all(bounds <= pvals)
+    assert bounds[0] == 0.5  # not above expected count
+    assert pytest.approx(bounds[4], rel=0.1) == pvals[4]  # tail dominated by first term
@@ -0,0 +1,95 @@
+import io
+
+import numpy as np
+import pytest
+
+from revonto.results import ResultsTable, ReverseLookupRecord
+from revonto.reverse_lookup import GOReverseLookupStudy
+
+
+@pytest.fixture
+def results_table(annotations_test, godag_test):
+    study = GOReverseLookupStudy(annotations_test, godag_test, methods=["fdr_bh"])
+    studyset = ["GO:0000002", "GO:0005829", "GO:0000006"]
+    return study.run_study(studyset, as_table=True), study.run_study(studyset)
+
+
+def test_results_table_records(results_table):
+    table, records = results_table
+    assert len(table) == len(records)
+    for r, e in zip(table, records):
+        assert r.object_id == e.object_id
+        assert r.pvals == e.pvals
+        assert r.study_items == e.study_items
+        assert r.population_items == e.population_items
+        assert (r.study_count, r.study_n, r.pop_count, r.pop_n) == (
+            e.study_count,
+            e.study_n,
+            e.pop_count,
+            e.pop_n,
+        )
+
+
+def test_results_table_sort_filter(results_table):
+    table, records = results_table
+    by_pval = table.sort("uncorrected")
+    assert np.all(np.diff(by_pval.pvals["uncorrected"]) >= 0)
+    assert set(by_pval.object_ids) == set(table.object_ids)
+    descending = table.sort("study_count", descending=True)
+    assert np.all(np.diff(descending.counts["study_count"]) <= 0)
+    for r in descending:
+        assert (
+            r.study_items
+            == table[list(table.object_ids).index(r.object_id)].study_items
+        )
+
+    significant = table.filter(table.pvals["fdr_bh"] < 0.5)
+    assert list(significant.object_ids) == [
+        r.object_id for r in records if r.pvals["fdr_bh"] < 0.5
+    ]
+    assert len(table[:0]) == 0
+    assert table[-1].object_id == records[-1].object_id
+
+
+def test_results_table_from_records_and_tsv(results_table):
+    table, records = results_table
+    from_records = ResultsTable.from_records(records)
+    assert [r.study_items for r in from_records] == [r.study_items for r in records]
+
+    out = io.StringIO()
+    table.to_tsv(out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].split("\t") == [
+        "object_id",
+        "study_count",
+        "study_n",
+        "pop_count",
+        "pop_n",
+        "uncorrected",
+        "fdr_bh",
+        "study_items",
+    ]
+    assert len(lines) == len(records) + 1
+    first = lines[1].split("\t")
+    assert first[0] == records[0].object_id
+    assert float(first[5]) == records[0].pvals["uncorrected"]
+    assert set(first[7].split(",")) == records[0].study_items
+
+
+def test_results_table_parquet(results_table, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    table, records = results_table
+    table.to_parquet(tmp_path / "results.parquet")
+    read = pq.read_table(tmp_path / "results.parquet").to_pydict()
+    assert read["object_id"] == [r.object_id for r in records]
+    assert [set(items) for items in read["study_items"]] == [
+        r.study_items for r in records
+    ]
+
+
+def test_record_defaults_not_shared():
+    a, b = ReverseLookupRecord("A"), ReverseLookupRecord("B")
+    a.add_pval("uncorrected", 0.1)
+    a.study_items.add("GO:0000002")
+    assert b.pvals == {}
+    assert b.study_items == set()
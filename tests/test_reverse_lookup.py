@@ -1,6 +1,21 @@
+import asyncio
+
+import numpy as np
 import pytest
 
-from revonto.reverse_lookup import GOReverseLookupStudy
+from revonto.associations import Annotation, Annotations
+from revonto.index import ReverseLookupIndex
+from revonto.ontology import GODag, GOTerm
+from revonto.pvalcalc import PvalueCache, shared_pval_cache
+from revonto.results import ResultCache
+from revonto.reverse_lookup import (
+    GOReverseLookupStudy,
+    ReverseLookupRecord,
+    results_at_least,
+    results_intersection,
+    results_overlap,
+    results_union,
+)
 
 
 def test_reverse_lookup_study(annotations_test, godag_test):
@@ -15,3 +30,331 @@ def test_reverse_lookup_study(annotations_test, godag_test):
     assert (
         pytest.approx(results[0].pvals["bonferroni"]) == 0.20000000000000004
     )  # only one test was done
+
+
+def test_reverse_lookup_study_logfactorial(annotations_test, godag_test):
+    studyset = ["GO:0000002", "GO:0005829"]
+
+    study = GOReverseLookupStudy(
+        annotations_test, godag_test, pvalcalc="fisher_logfactorial"
+    )
+
+    results = study.run_study(studyset)
+
+    assert pytest.approx(results[0].pvals["uncorrected"]) == 0.20000000000000004
+    assert study._logfact_table.n == len(godag_test)
+
+
+def test_reverse_lookup_shared_pval_cache(annotations_test, godag_test):
+    cache = PvalueCache()
+    study1 = GOReverseLookupStudy(annotations_test, godag_test, pval_cache=cache)
+    study2 = GOReverseLookupStudy(annotations_test, godag_test, pval_cache=cache)
+
+    results1 = study1.run_study(["GO:0000002", "GO:0005829"])
+    results2 = study2.run_study(["GO:0000002", "GO:0005829"])
+
+    assert results1[0].pvals["uncorrected"] == results2[0].pvals["uncorrected"]
+    assert cache.hits >= 1
+
+
+@pytest.fixture
+def random_study():
+    rng = np.random.default_rng(0)
+    godag = GODag({f"GO:{i:07}": GOTerm(f"GO:{i:07}") for i in range(300)})
+    term_ids = list(godag)
+    anno = Annotations(
+        Annotation(object_id=f"P{p}", term_id=term_id)
+        for p in range(200)
+        for term_id in rng.choice(term_ids, rng.integers(1, 60), replace=False)
+    )
+    studyset = list(rng.choice(term_ids, 40, replace=False))
+    # a few products enriched in the studyset
+    anno.update(
+        Annotation(object_id=f"P{p}", term_id=term_id)
+        for p in range(5)
+        for term_id in studyset[: 10 + 5 * p]
+    )
+    return GOReverseLookupStudy(anno, godag), studyset
+
+
+@pytest.mark.parametrize("methods", [["bonferroni"], ["holm", "fdr_bh"]])
+def test_run_study_prune(random_study, methods):
+    study, studyset = random_study
+    full = study.run_study(studyset, methods=methods)
+    pruned = study.run_study(studyset, methods=methods, prune=True)
+
+    assert len(pruned) < len(full)
+    full_by_id = {r.object_id: r for r in full}
+    for method in methods:
+        significant = {r.object_id for r in full if r.pvals[method] <= 0.05}
+        assert significant
+        assert significant == {r.object_id for r in pruned if r.pvals[method] <= 0.05}
+        for r in pruned:
+            if r.object_id in significant:
+                assert pytest.approx(r.pvals[method]) == (
+                    full_by_id[r.object_id].pvals[method]
+                )
+
+
+@pytest.mark.parametrize("methods", [["bonferroni"], ["holm", "fdr_bh", "fdr_by"]])
+def test_run_study_top_k(random_study, methods):
+    study, studyset = random_study
+    full = study.run_study(studyset, methods=methods)
+    top = study.run_study(studyset, methods=methods, top_k=3)
+
+    best = sorted(full, key=lambda r: r.pvals["uncorrected"])[:3]
+    assert [r.object_id for r in top] == [r.object_id for r in best]
+    for r, b in zip(top, best):
+        for method in methods:
+            assert pytest.approx(r.pvals[method]) == b.pvals[method]
+    assert study.run_study(studyset, top_k=0) == []
+
+    with pytest.raises(ValueError):
+        study.run_study(studyset, prune=True, methods=["sm_fdr_tsbh"])
+
+
+def test_run_study_prune_without_methods(random_study):
+    study, studyset = random_study
+    full = study.run_study(studyset, methods=[])
+    pruned = study.run_study(studyset, methods=[], prune=True)
+    assert [r.object_id for r in pruned] == [r.object_id for r in full]
+    assert [r.pvals for r in pruned] == [r.pvals for r in full]
+
+
+def test_run_study_top_k_step_up():
+    # many products with the same p-value: fdr_bh of the top_k depends on all of them
+    godag = GODag({f"GO:{i:07}": GOTerm(f"GO:{i:07}") for i in range(10)})
+    studyset = ["GO:0000000", "GO:0000001", "GO:0000002"]
+    anno = Annotations(
+        Annotation(object_id=f"P{p}", term_id=term_id)
+        for p in range(1000)
+        for term_id in studyset
+    )
+    anno.update(Annotation(object_id="Q", term_id=f"GO:{i:07}") for i in range(3, 10))
+    study = GOReverseLookupStudy(anno, godag, methods=["fdr_bh"])
+
+    full = study.run_study(studyset)
+    top = study.run_study(studyset, top_k=5)
+
+    assert len(top) == 5
+    for r in top:
+        assert pytest.approx(r.pvals["fdr_bh"]) == full[0].pvals["fdr_bh"]
+
+
+@pytest.mark.parametrize("pvalcalc", ["fisher_scipy_stats", "fisher_logfactorial"])
+def test_run_studies(random_study, pvalcalc):
+    study, studyset = random_study
+    study.pval_method = pvalcalc
+    methods = ["bonferroni", "fdr_bh", "sm_holm"]
+    studysets = [studyset, studyset[:7], [], studyset[20:] + ["GO:9999999"]]
+
+    all_results = study.run_studies(studysets, methods=methods)
+
+    assert len(all_results) == len(studysets)
+    for studyset, results in zip(studysets, all_results):
+        expected = study.run_study(studyset, methods=methods)
+        assert [r.object_id for r in results] == [r.object_id for r in expected]
+        for r, e in zip(results, expected):
+            assert r.study_items == e.study_items
+            assert (r.study_count, r.study_n, r.pop_count, r.pop_n) == (
+                e.study_count,
+                e.study_n,
+                e.pop_count,
+                e.pop_n,
+            )
+            for method in ["uncorrected"] + methods:
+                assert pytest.approx(e.pvals[method]) == r.pvals[method]
+
+    tables = study.run_studies(studysets, methods=methods, as_table=True)
+    for table, results in zip(tables, all_results):
+        assert list(table.object_ids) == [r.object_id for r in results]
+        np.testing.assert_allclose(
+            table.pvals["fdr_bh"], [r.pvals["fdr_bh"] for r in results]
+        )
+
+
+def test_run_studies_families(random_study):
+    study, studyset = random_study
+    studysets = [studyset, studyset[:7], studyset[20:]]
+    bonferroni = {
+        family: [
+            {r.object_id: r.pvals["bonferroni"] for r in results}
+            for results in study.run_studies(studysets, family=family)
+        ]
+        for family in ["studyset", "product", "all"]
+    }
+    uncorrected = [
+        {r.object_id: r.pvals["uncorrected"] for r in results}
+        for results in study.run_studies(studysets)
+    ]
+    n_tests = sum(len(pvals) for pvals in uncorrected)
+    for i, pvals in enumerate(uncorrected):
+        for object_id, pval in pvals.items():
+            n_studies = sum(object_id in other for other in uncorrected)
+            assert bonferroni["studyset"][i][object_id] == pytest.approx(
+                min(pval * len(pvals), 1)
+            )
+            assert bonferroni["product"][i][object_id] == pytest.approx(
+                min(pval * n_studies, 1)
+            )
+            assert bonferroni["all"][i][object_id] == pytest.approx(
+                min(pval * n_tests, 1)
+            )
+    with pytest.raises(ValueError):
+        study.run_studies(studysets, family="unknown")
+
+
+def test_run_study_expand(annotations_test, godag_test):
+    study = GOReverseLookupStudy(annotations_test, godag_test)
+    results = study.run_study(["GO:0000002"], expand=True)
+    expected = study.run_study(["GO:0000002", "GO:0000006", "GO:0000015"])
+    assert [r.object_id for r in results] == [r.object_id for r in expected]
+    assert [r.pvals for r in results] == [r.pvals for r in expected]
+    (unexpanded,) = study.run_studies([["GO:0000002"]], expand=True, expand_depth=0)
+    assert unexpanded[0].study_items == {"GO:0000002"}
+
+
+def test_result_cache(annotations_test, godag_test, tmp_path):
+    studyset = ["GO:0000002", "GO:0005829"]
+    cache = ResultCache(maxsize=2, path=tmp_path)
+    study = GOReverseLookupStudy(annotations_test, godag_test, result_cache=cache)
+
+    expected = study.run_study(studyset)
+    assert cache.info()["misses"] == 1
+    results = study.run_study(list(reversed(studyset)))
+    assert cache.info()["hits"] == 1
+    assert [r.pvals for r in results] == [r.pvals for r in expected]
+    study.run_study(studyset, methods=["fdr_bh"])
+    assert cache.misses == 2
+
+    # persisted: a new cache and study find the results on disk
+    study2 = GOReverseLookupStudy(
+        annotations_test, godag_test, result_cache=ResultCache(path=tmp_path)
+    )
+    results = study2.run_study(studyset)
+    assert study2.result_cache.hits == 1
+    assert [r.population_items for r in results] == [
+        r.population_items for r in expected
+    ]
+
+    # changed annotations are a different query
+    annotations_test.add(Annotation(object_id="NEW", term_id="GO:0000002"))
+    assert "NEW" in {r.object_id for r in study.run_study(studyset)}
+    assert cache.misses == 3
+
+
+def test_iter_study(random_study):
+    study, studyset = random_study
+    expected = study.run_study(studyset, methods=["fdr_bh"])
+
+    chunks = list(study.iter_study(studyset, chunk_size=30, methods=["fdr_bh"]))
+    assert [len(chunk) for chunk in chunks[:-1]] == [30] * (len(chunks) - 1)
+    results = [r for chunk in chunks for r in chunk]
+    assert [r.object_id for r in results] == [r.object_id for r in expected]
+    assert [r.pvals for r in results] == [r.pvals for r in expected]
+    assert all(r.population_items == set() for r in results)
+
+    def keep_if(r):
+        return r.pvals["fdr_bh"] < 0.05
+
+    tables = list(
+        study.iter_study(
+            studyset,
+            chunk_size=30,
+            methods=["fdr_bh"],
+            as_table=True,
+            population_items=True,
+            keep_if=keep_if,
+        )
+    )
+    significant = [r for r in expected if keep_if(r)]
+    assert [r.object_id for table in tables for r in table] == [
+        r.object_id for r in significant
+    ]
+    assert list(study.iter_study([])) == []
+
+
+def test_stream_study(random_study, tmp_path):
+    study, studyset = random_study
+    expected = study.run_study(studyset)
+
+    chunks = []
+    assert study.stream_study(studyset, chunks.append, chunk_size=50) == len(expected)
+    assert sum(len(chunk) for chunk in chunks) == len(expected)
+
+    path = tmp_path / "results.tsv"
+    assert study.stream_study(studyset, path, chunk_size=50) == len(expected)
+    lines = path.read_text().splitlines()
+    assert lines[0].startswith("object_id\t")
+    assert [line.split("\t")[0] for line in lines[1:]] == [
+        r.object_id for r in expected
+    ]
+    assert study.stream_study([], path) == 0
+    assert len(path.read_text().splitlines()) == 1
+
+
+def test_reverse_lookup_index_invalidation(annotations_test, godag_test):
+    study = GOReverseLookupStudy(annotations_test, godag_test)
+    index = study.index
+    study.run_study(["GO:0000002"])
+    assert study.index is index  # not rebuilt between studies
+
+    annotations_test.add(Annotation(object_id="NEW", term_id="GO:0000002"))
+    assert study.index is not index
+    assert "NEW" in {r.object_id for r in study.run_study(["GO:0000002"])}
+
+
+def test_run_study_async(random_study, monkeypatch):
+    study, studyset = random_study
+    expected = study.run_study(studyset, methods=["fdr_bh"])
+    study = GOReverseLookupStudy(study.anno, study.obo_dag, methods=["fdr_bh"])
+    builds = []
+    from_annotations = ReverseLookupIndex.from_annotations
+    monkeypatch.setattr(
+        ReverseLookupIndex,
+        "from_annotations",
+        classmethod(lambda cls, anno: builds.append(1) or from_annotations(anno)),
+    )
+
+    async def run_concurrently():
+        return await asyncio.gather(
+            *(study.run_study_async(studyset) for _ in range(8)),
+            study.run_studies_async([studyset, studyset[:5]]),
+        )
+
+    *all_results, batch = asyncio.run(run_concurrently())
+    assert len(builds) == 1  # concurrent studies share one index
+    for results in all_results + [batch[0]]:
+        assert {r.object_id: r.pvals for r in results} == {
+            r.object_id: r.pvals for r in expected
+        }
+
+
+def test_results_set_operations():
+    lists = [
+        [ReverseLookupRecord(objid) for objid in ["A", "B", "C"]],
+        [ReverseLookupRecord(objid) for objid in ["B", "C", "D"]],
+        [ReverseLookupRecord(objid) for objid in ["C", "D", "D"]],
+    ]
+
+    intersection = results_intersection(*lists)
+    assert list(intersection) == ["C"]
+    assert intersection["C"] == [lists[0][2], lists[1][1], lists[2][0]]
+    assert list(results_union(*lists)) == ["A", "B", "C", "D"]
+    assert list(results_at_least(2, *lists)) == ["B", "C", "D"]
+    assert results_intersection(lists[0], []) == {}
+
+    overlap = results_overlap(*lists)
+    assert overlap.tolist() == [[3, 2, 1], [2, 3, 2], [1, 2, 2]]
+    jaccard = results_overlap(*lists, measure="jaccard")
+    assert pytest.approx(jaccard[0, 1]) == 2 / 4
+    assert np.all(np.diag(jaccard) == 1)
+    with pytest.raises(ValueError):
+        results_overlap(*lists, measure="dice")
+
+
+def test_reverse_lookup_default_pval_cache(annotations_test, godag_test):
+    study1 = GOReverseLookupStudy(annotations_test, godag_test)
+    study2 = GOReverseLookupStudy(annotations_test, godag_test)
+    assert study1.pval_cache is study2.pval_cache is shared_pval_cache
+    assert shared_pval_cache.maxsize <= 2**16
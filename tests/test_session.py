@@ -0,0 +1,58 @@
+import pytest
+
+from revonto.associations import Annotation
+from revonto.reverse_lookup import GOReverseLookupStudy
+from revonto.session import StudySession
+
+
+def assert_same_results(results, expected):
+    assert [r.object_id for r in results] == [r.object_id for r in expected]
+    for r, e in zip(results, expected):
+        assert r.pvals == pytest.approx(e.pvals)
+        assert r.study_items == e.study_items
+        assert (r.study_count, r.study_n, r.pop_count, r.pop_n) == (
+            e.study_count,
+            e.study_n,
+            e.pop_count,
+            e.pop_n,
+        )
+
+
+def test_study_session(annotations_test, godag_test):
+    study = GOReverseLookupStudy(annotations_test, godag_test, methods=["fdr_bh"])
+    session = StudySession(study, ["GO:0000002"])
+    assert_same_results(session.results(), study.run_study(["GO:0000002"]))
+
+    session.add("GO:0005829", "GO:9999999")
+    assert_same_results(session.results(), study.run_study(list(session.studyset)))
+
+    session.edit(add=["GO:0000006"], remove=["GO:0000002"])  # same study_n
+    assert session.studyset == {"GO:0005829", "GO:9999999", "GO:0000006"}
+    assert_same_results(session.results(), study.run_study(list(session.studyset)))
+
+    session.remove("GO:0005829", "GO:0000006", "GO:9999999")
+    assert session.results() == []
+    assert not session.study_counts.any()
+
+
+def test_study_session_annotations_changed(annotations_test, godag_test):
+    study = GOReverseLookupStudy(annotations_test, godag_test)
+    session = StudySession(study, ["GO:0000002"])
+    session.results()
+
+    annotations_test.add(Annotation(object_id="NEW", term_id="GO:0000002"))
+    assert "NEW" in {r.object_id for r in session.results()}
+    session.add("GO:0005829")
+    assert_same_results(session.results(), study.run_study(list(session.studyset)))
+
+
+def test_study_session_topology_algorithm(annotations_test, godag_test):
+    study = GOReverseLookupStudy(annotations_test, godag_test, algorithm="elim")
+    with pytest.raises(ValueError):
+        StudySession(study, ["GO:0000002", "GO:0000006", "GO:0005829"])
+
+    classic = GOReverseLookupStudy(annotations_test, godag_test)
+    session = StudySession(classic, ["GO:0000002"])
+    classic.algorithm = "weight"
+    with pytest.raises(ValueError):
+        session.results()
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import os
+
+from revonto import timing
+from revonto.associations import Annotation, Annotations
+from revonto.ontology import GODag
+from revonto.reverse_lookup import GOReverseLookupStudy
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def test_collect_spans():
+    with timing.collect() as spans:
+        godag = GODag.from_file(os.path.join(DATA, "go1.obo"))
+        anno = Annotations.from_file(os.path.join(DATA, "human_test.gaf"))
+        anno.propagate_associations(godag)
+        results = GOReverseLookupStudy(anno, godag).run_study(["GO:0000002"])
+
+    by_name = {span.name: span for span in spans}
+    assert [span.name for span in spans] == [
+        "GODag.from_file",
+        "Annotations.from_file",
+        "propagate_associations",
+        "pvalues",
+        "multiple_correction",
+        "run_study",
+    ]
+    assert by_name["GODag.from_file"].items == {"terms": len(godag)}
+    assert by_name["propagate_associations"].items == {"annotations": len(anno)}
+    assert by_name["run_study"].items == {"studyset": 1, "results": len(results)}
+    assert all(span.seconds >= 0 for span in spans)
+
+    GODag.from_file(os.path.join(DATA, "go1.obo"))
+    assert len(spans) == len(by_name)  # hook removed after the block
+
+
+def test_log_spans(caplog, monkeypatch):
+    async def find_orthologs(ids, src_taxon, target_taxon, database):
+        return {"A": ["ENSG1"]}
+
+    monkeypatch.setattr("revonto.associations._find_orthologs_async", find_orthologs)
+    anno = Annotations([Annotation(object_id="DB:A", term_id="GO:1", taxon="7955")])
+    hook = timing.log_spans(logging.INFO)
+    try:
+        with caplog.at_level(logging.INFO, logger="revonto.timing"):
+            asyncio.run(anno.find_orthologs_async("9606"))
+    finally:
+        timing.remove_hook(hook)
+    assert "Span(find_orthologs" in caplog.text
+    assert "annotations=2" in caplog.text
@@ -0,0 +1,111 @@
+import pytest
+
+from revonto.associations import Annotation, Annotations
+from revonto.ontology import GODag, GOTerm
+from revonto.reverse_lookup import GOReverseLookupStudy
+
+
+@pytest.fixture
+def topology_study():
+    # R -> A -> B and R -> C, annotations propagated to all ancestors
+    godag = GODag()
+    for term_id, parents in [("R", []), ("A", ["R"]), ("B", ["A"]), ("C", ["R"])]:
+        godag[term_id] = GOTerm(term_id)
+        godag[term_id]._parents = set(parents)
+    godag._populate_terms()
+    anno = Annotations(
+        Annotation(object_id=object_id, term_id=term_id)
+        for object_id, term_ids in [
+            ("P1", ["R", "A", "B"]),
+            ("P2", ["R", "A"]),
+            ("P3", ["R", "C"]),
+        ]
+        for term_id in term_ids
+    )
+    return GOReverseLookupStudy(anno, godag)
+
+
+def _counts(results):
+    return {
+        r.object_id: (r.study_count, r.study_n, r.pop_count, r.pop_n) for r in results
+    }
+
+
+def test_elim(topology_study):
+    results = topology_study.run_study(["R", "A", "B"], algorithm="elim")
+    # A and R are eliminated by B (P1), R by A (P2)
+    assert _counts(results) == {
+        "P1": (1, 3, 1, 4),
+        "P2": (1, 3, 1, 4),
+        "P3": (1, 3, 2, 4),
+    }
+    assert next(r for r in results if r.object_id == "P1").study_items == {"B"}
+
+
+def test_weight(topology_study):
+    results = topology_study.run_study(["R", "A", "B"], algorithm="weight")
+    # P1: B + A / 2 + R / 3, P2: A + R / 2 (rounded down)
+    assert _counts(results) == {
+        "P1": (1, 3, 1, 4),
+        "P2": (1, 3, 1, 4),
+        "P3": (1, 3, 2, 4),
+    }
+    # P1: B + C + A / 2 + R / 4 = 2.75, elim counts 2 (B and C), classic 4
+    study_items = topology_study.anno | {Annotation(object_id="P1", term_id="C")}
+    study = GOReverseLookupStudy(Annotations(study_items), topology_study.obo_dag)
+    counts = {
+        algorithm: _counts(study.run_study(["R", "A", "B", "C"], algorithm=algorithm))[
+            "P1"
+        ][0]
+        for algorithm in ["classic", "elim", "weight"]
+    }
+    assert counts == {"classic": 4, "elim": 2, "weight": 2}
+
+
+def test_parent_child(topology_study):
+    results = topology_study.run_study(["A", "B"], algorithm="parent_child")
+    # population of P1 and P2: the root R and the children of their annotated terms (A, B, C)
+    assert _counts(results) == {"P1": (2, 2, 3, 4), "P2": (1, 2, 2, 4)}
+    with pytest.raises(ValueError):
+        topology_study.run_study(["A", "B"], algorithm="parent_child", prune=True)
+
+
+def test_parent_child_logfactorial(topology_study):
+    expected = topology_study.run_study(["A", "B"], algorithm="parent_child")
+    topology_study.pval_method = "fisher_logfactorial"
+    results = topology_study.run_study(["A", "B"], algorithm="parent_child")
+    assert _counts(results) == _counts(expected)
+    for r, e in zip(results, expected):
+        assert pytest.approx(r.pvals["uncorrected"]) == e.pvals["uncorrected"]
+
+
+@pytest.mark.parametrize("pvalcalc", ["fisher_scipy_stats", "binomial_scipy_stats"])
+def test_parent_child_unpropagated(topology_study, pvalcalc):
+    anno = Annotations(
+        Annotation(object_id=object_id, term_id=term_id)
+        for object_id, term_ids in [("P1", ["B"]), ("P2", ["R", "A"]), ("P3", ["C"])]
+        for term_id in term_ids
+    )
+    study = GOReverseLookupStudy(anno, topology_study.obo_dag, pvalcalc=pvalcalc)
+    results = study.run_study(["A", "B"], algorithm="parent_child")
+    # A, the parent of B, is not annotated to P1: no study item left, P1 is not tested
+    assert _counts(results) == {"P2": (1, 2, 2, 4)}
+    assert results[0].study_items == {"A"}
+
+
+def test_classic_unchanged(topology_study):
+    assert _counts(topology_study.run_study(["R", "A", "B"])) == _counts(
+        topology_study.run_study(["R", "A", "B"], algorithm="classic")
+    )
+    with pytest.raises(ValueError):
+        topology_study.run_study(["A"], algorithm="unknown")
+
+
+def test_get_pval_uncorr_algorithm(topology_study):
+    topology_study.algorithm = "elim"
+    assert _counts(topology_study.get_pval_uncorr(["R", "A", "B"])) == _counts(
+        topology_study.run_study(["R", "A", "B"])
+    )
+    assert _counts(
+        topology_study.get_pval_uncorr(["R", "A", "B"], algorithm="classic")
+    ) == _counts(topology_study.run_study(["R", "A", "B"], algorithm="classic"))